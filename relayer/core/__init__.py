@@ -14,16 +14,113 @@
 # limitations under the License.
 #
 
+import io
 import os
 import re
 import sys
 import enum
-import simplejson
+import copy
+import json
+import logging
+import functools
 
 from ruamel import yaml
 
 from . import helpers
 
+# the level of logger.verbose() records
+_VERBOSE_LOG_LEVEL = 5
+
+# matches a list level with a following index in square brackets, e.g. "a[0]" / "a[start]"
+_LIST_IDX_RE = re.compile(r"(?P<level>.*)\[(?P<idx>.*)\]")
+
+# matches the dots that split levels of a key (escaped dots are part of the level itself)
+_DOT_SPLIT_RE = re.compile(r"(?<!\\)\.")
+
+
+@functools.lru_cache(maxsize=4096)
+def _split_key(full_key):
+    """
+    Splits a key into its levels (kvs of the same run tend to share keys, so the split is cached)
+    """
+
+    # flat key, a single level
+    if "." not in full_key:
+        return (full_key,)
+
+    # split dict levels by '.' only, and clean up the escaping for the rest of the flow
+    if "\\" not in full_key:
+        return tuple(full_key.split("."))
+
+    return tuple(level.replace("\\.", ".") for level in _DOT_SPLIT_RE.split(full_key))
+
+
+@functools.lru_cache(maxsize=4096)
+def _enrich_level_index(level):
+    """
+    Splits a level into its name and list index (None if it's not a list level)
+    """
+    if "[" not in level:
+        return level, None
+
+    list_index_re = _LIST_IDX_RE.match(level)
+    if list_index_re is not None:
+        level = list_index_re.group("level")
+        idx = list_index_re.group("idx")
+        if idx.isdigit():
+            return level, int(idx)
+        return level, idx
+    return level, None
+
+
+# resolves plain scalars the way YAML 1.1 consumers (e.g. PyYAML) do - "on", "yes", "y" are bools
+_YAML11_RESOLVER = yaml.resolver.VersionedResolver(version=(1, 1))
+
+
+@functools.lru_cache(maxsize=4096)
+def _is_yaml11_non_str(value):
+    """
+    Whether a YAML 1.1 loader reads value, when emitted unquoted, as anything but a string
+    """
+    tag = _YAML11_RESOLVER.resolve(yaml.nodes.ScalarNode, value, (True, False))
+    return tag != "tag:yaml.org,2002:str"
+
+
+class _SafeRepresenter(yaml.representer.SafeRepresenter):
+    """
+    A safe representer that keeps mappings in their loaded order (instead of sorting them) and
+    knows how to emit ruamel's scalar strings as plain strings. Strings that YAML 1.1 loaders
+    would read as another type are quoted, so they stay strings for any consumer of the config
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(_SafeRepresenter, self).__init__(*args, **kwargs)
+        self.sort_base_mapping_type_on_output = False
+
+    def represent_str(self, data):
+        if _is_yaml11_non_str(data):
+            return self.represent_scalar("tag:yaml.org,2002:str", data, style="'")
+        return super(_SafeRepresenter, self).represent_str(data)
+
+    def represent_scalar_string(self, data):
+        return self.represent_str(str(data))
+
+
+_SafeRepresenter.add_representer(str, _SafeRepresenter.represent_str)
+_SafeRepresenter.add_multi_representer(
+    yaml.scalarstring.ScalarString, _SafeRepresenter.represent_scalar_string
+)
+
+
+def _create_safe_yaml():
+    """
+    Creates a safe (non round-trip) YAML instance, backed by libyaml when available
+    """
+    safe_yaml = yaml.YAML(typ="safe")
+    safe_yaml.Representer = _SafeRepresenter
+    safe_yaml.default_flow_style = False
+    return safe_yaml
+
 
 class Relayer(object):
     class KeyOperations(enum.Enum):
@@ -34,19 +131,90 @@ class Relayer(object):
         ExtendList = 4
         InsertToList = 5
 
-        @classmethod
-        def all_remove_operations(cls):
-            return [cls.Remove, cls.RemoveListElement]
-
     class ListIndices(object):
         start = "start"
         end = "end"
 
-    def __init__(self, logger, config_path, debug=False):
+    # the _modify_key modes each key operation is applied with
+    _key_operation_modes = {
+        KeyOperations.Update: {
+            "append_mode": False,
+            "extend_mode": False,
+            "list_insert_mode": False,
+            "rm_mode": False,
+            "rm_value_mode": False,
+        },
+        KeyOperations.Add: {
+            "append_mode": True,
+            "extend_mode": False,
+            "list_insert_mode": False,
+            "rm_mode": False,
+            "rm_value_mode": False,
+        },
+        KeyOperations.ExtendList: {
+            "append_mode": True,
+            "extend_mode": True,
+            "list_insert_mode": False,
+            "rm_mode": False,
+            "rm_value_mode": False,
+        },
+        KeyOperations.InsertToList: {
+            "append_mode": True,
+            "extend_mode": False,
+            "list_insert_mode": True,
+            "rm_mode": False,
+            "rm_value_mode": False,
+        },
+        KeyOperations.Remove: {
+            "append_mode": False,
+            "extend_mode": False,
+            "list_insert_mode": False,
+            "rm_mode": True,
+            "rm_value_mode": False,
+        },
+        KeyOperations.RemoveListElement: {
+            "append_mode": False,
+            "extend_mode": False,
+            "list_insert_mode": False,
+            "rm_mode": True,
+            "rm_value_mode": True,
+        },
+    }
+
+    _remove_operations = frozenset(
+        [KeyOperations.Remove, KeyOperations.RemoveListElement]
+    )
+
+    def __init__(self, logger, config_path, debug=False, round_trip=True):
         self._logger = logger
         self._config_path = config_path
         self._debug = debug
 
+        # the key walk logs a lot on these levels - skip building the log records when filtered out
+        is_enabled_for = getattr(logger, "isEnabledFor", lambda level: True)
+        self._verbose_enabled = is_enabled_for(_VERBOSE_LOG_LEVEL)
+        self._debug_enabled = is_enabled_for(logging.DEBUG)
+
+        # configs are round-tripped (comments, anchors and quotes are kept) unless round_trip is
+        # off, in which case they're loaded and dumped by the safe loader and dumper
+        self._round_trip = round_trip
+        self._safe_yaml = _create_safe_yaml()
+
+        # resolved on first use, and reused by following relayer_config calls
+        self._resolved_config_path = None
+
+    @property
+    def config_path(self):
+        return self._config_path
+
+    @config_path.setter
+    def config_path(self, config_path):
+        """
+        Points the relayer at another config (resolved again on next use)
+        """
+        self._config_path = config_path
+        self._resolved_config_path = None
+
     def relayer_config(
         self,
         add_kvs,
@@ -58,57 +226,41 @@ class Relayer(object):
         file_path_to_merge,
         ignore_not_found=False,
     ):
-        merge_changed = False
+        if self._resolved_config_path is None:
+            self._resolved_config_path = self._resolve_config_path(self._config_path)
 
-        resolved_config_path = self._resolve_config_path(self._config_path)
+        resolved_config_path = self._resolved_config_path
         config = self._load_config(resolved_config_path)
-        config, rm_changed = self._mod_kvs(
-            config,
-            rm_keys or [],
-            operation=self.KeyOperations.Remove,
-            ignore_not_found=ignore_not_found,
-        )
-        config, rm_list_changed = self._mod_kvs(
-            config,
-            rm_list_element_keys or [],
-            operation=self.KeyOperations.RemoveListElement,
-            ignore_not_found=ignore_not_found,
-        )
-        config, up_changed = self._mod_kvs(
-            config, update_kvs or [], operation=self.KeyOperations.Update
-        )
-        config, add_changed = self._mod_kvs(
-            config, add_kvs or [], operation=self.KeyOperations.Add
-        )
-        config, extend_changed = self._mod_kvs(
-            config, extend_kvs or [], operation=self.KeyOperations.ExtendList
-        )
-        config, insert_changed = self._mod_kvs(
-            config, insert_kvs or [], operation=self.KeyOperations.InsertToList
+
+        # all requested operations are applied to the config in a single pass, in this order
+        operation_kvs = []
+        for operation, kvs in [
+            (self.KeyOperations.Remove, rm_keys),
+            (self.KeyOperations.RemoveListElement, rm_list_element_keys),
+            (self.KeyOperations.Update, update_kvs),
+            (self.KeyOperations.Add, add_kvs),
+            (self.KeyOperations.ExtendList, extend_kvs),
+            (self.KeyOperations.InsertToList, insert_kvs),
+        ]:
+            operation_kvs.extend((operation, kv) for kv in kvs or [])
+
+        config, changed = self._mod_kvs(
+            config, operation_kvs, ignore_not_found=ignore_not_found
         )
 
         if file_path_to_merge:
             config, merge_changed = self._merge_configs(config, file_path_to_merge)
+            changed |= merge_changed
 
-        changed = any(
-            [
-                rm_changed,
-                rm_list_changed,
-                up_changed,
-                add_changed,
-                extend_changed,
-                insert_changed,
-                merge_changed,
-            ]
-        )
         if not changed:
             self._logger.warn(
                 "No changes to configuration, not overwriting file",
                 config_path=resolved_config_path,
             )
-            return
+            return config
 
         self._dump_config(config, resolved_config_path)
+        return config
 
     def _resolve_config_path(self, original_config_path):
         """
@@ -148,11 +300,20 @@ class Relayer(object):
         """
         self._logger.info("Attempting to load config", config_path=config_path)
         try:
-            with open(config_path, "r") as f:
-                config = yaml.round_trip_load(f, preserve_quotes=True) or {}
-                self._logger.info(
-                    "Configuration file loaded successfully", config_path=config_path
+
+            # read the whole file in one go, and let the parser decode it
+            with open(config_path, "rb") as f:
+                config_contents = f.read()
+
+            if self._round_trip:
+                config = (
+                    yaml.round_trip_load(config_contents, preserve_quotes=True) or {}
                 )
+            else:
+                config = self._safe_yaml.load(config_contents) or {}
+            self._logger.info(
+                "Configuration file loaded successfully", config_path=config_path
+            )
         except yaml.YAMLError as exc:
             self._logger.error(
                 "Failed to parse configuration file, malformed config.",
@@ -172,138 +333,89 @@ class Relayer(object):
     def _dump_config(self, config, config_path):
         if self._debug:
             self._logger.debug("Dumping modified configuration to stdout")
-            yaml.round_trip_dump(config, sys.stdout)
+            self._dump_yaml(config, sys.stdout)
             return
 
         self._logger.debug(
             "Dumping modified configuration to file", config_path=config_path
         )
         with open(config_path, "w") as fh:
-            yaml.round_trip_dump(config, fh)
+            self._dump_yaml(config, fh)
 
-    def _mod_kvs(self, config, kvs, operation=None, ignore_not_found=False):
-        mod_key_kwargs = {
-            "append_mode": False,
-            "extend_mode": False,
-            "list_insert_mode": False,
-            "rm_mode": False,
-            "rm_value_mode": False,
-            "ignore_not_found": ignore_not_found,
-        }
-        changed = False
+    def _dump_yaml(self, config, stream):
+        if not self._round_trip:
 
-        if operation == self.KeyOperations.Update:
-            self._logger.info("Updating requested keys", kvs=kvs)
-        elif operation == self.KeyOperations.Add:
-            self._logger.info("Adding requested keys", kvs=kvs)
-            mod_key_kwargs["append_mode"] = True
-        elif operation == self.KeyOperations.ExtendList:
-            self._logger.info("Extending requested list keys", kvs=kvs)
-            mod_key_kwargs["append_mode"] = True
-            mod_key_kwargs["extend_mode"] = True
-        elif operation == self.KeyOperations.InsertToList:
-            self._logger.info("Inserting requested keys", kvs=kvs)
-            mod_key_kwargs["append_mode"] = True
-            mod_key_kwargs["list_insert_mode"] = True
-        elif operation == self.KeyOperations.Remove:
-            self._logger.info("Removing requested keys", kvs=kvs)
-            mod_key_kwargs["append_mode"] = False
-            mod_key_kwargs["rm_mode"] = True
-        elif operation == self.KeyOperations.RemoveListElement:
-            self._logger.info("Removing requested values from keys", kvs=kvs)
-            mod_key_kwargs["append_mode"] = False
-            mod_key_kwargs["rm_mode"] = True
-            mod_key_kwargs["rm_value_mode"] = True
-        else:
-            raise RuntimeError("Unknown key operation: {0}".format(operation))
+            # emitted to a buffer first, so a failed dump doesn't leave a partially written stream
+            config_contents = io.StringIO()
+            try:
+                self._safe_yaml.dump(config, config_contents)
+            except yaml.representer.RepresenterError as exc:
+                self._logger.warn(
+                    "Config can't be dumped by the safe dumper, falling back to round-trip",
+                    exc=str(exc),
+                )
+            else:
+                stream.write(config_contents.getvalue())
+                return
+
+        yaml.round_trip_dump(config, stream)
+
+    def _mod_kvs(self, config, operation_kvs, ignore_not_found=False):
+        """
+        Applies a list of (operation, kv) tuples to the config, in order
+        """
+        changed = False
+        for operation, kv in operation_kvs:
+            self._logger.info(
+                "Modifying requested key", operation=operation.name, kv=kv
+            )
+            try:
+                key_operation_modes = self._key_operation_modes[operation]
+            except KeyError:
+                raise RuntimeError("Unknown key operation: {0}".format(operation))
 
-        for kv in kvs:
-            if operation in self.KeyOperations.all_remove_operations():
+            key, sep, value = kv.partition("=")
+            if operation in self._remove_operations:
 
                 # accidental '=' in arg? ignore trailing chars
-                key = kv.split("=", 1)[0] if "=" in kv else kv
                 value = None
+            elif not sep:
+                raise ValueError("Expected a key=value argument, got: {0}".format(kv))
             else:
-                key, value = kv.split("=", 1)
-
-            # if value is actually a list (or dict), build a python list (or dict or list of dicts) out of it
-            if value is not None and ("," in value or "{" in value):
-                if "{" in value:
-                    try:
-                        converted_value = []
-
-                        # value is a dict or list of dicts (leave just the inner values,
-                        # without the surrounding parenthesis)
-                        value_dicts = [
-                            split_value.split("{")[1]
-                            for split_value in value.split("}")
-                            if split_value
-                        ]
-                        for value_dict in value_dicts:
-
-                            # for each "dict" construct a real dict and add it to the list
-                            # keep a list of keys and a list of lists of values
-                            keys = []
-                            values = []
-                            real_value_dict = {}
-
-                            # split all the commas, and infer what are keys and what are values
-                            comma_separated_string = value_dict.split(",")
-                            for key_or_values in comma_separated_string:
-
-                                # if it got : in the string, split and take the first item as key
-                                if ":" in key_or_values:
-                                    kv_split = key_or_values.split(":", 1)
-                                    keys.append(kv_split[0])
-
-                                    # the string after : and before , is a value, create a list of values with
-                                    # only one item for now, the else will append more items to it
-                                    if len(kv_split) > 1:
-                                        values.append(kv_split[1:])
-                                else:
-
-                                    # all other stuff are values (may be lists that were split)
-                                    # important to place them in the right index
-                                    values[-1].append(key_or_values)
-
-                            for k, v in zip(keys, values):
-                                # if we got a list of values for the key, pass it as is, else take the only item
-                                real_value_dict[k] = v if len(v) > 1 else v[0]
-
-                            converted_value.append(real_value_dict)
-
-                        value = converted_value
-                    except Exception:
-                        raise Exception(
-                            "Wrong value syntax - expected either a dictionary or a list of dictionaries"
-                        )
-                else:
-                    try:
+                value = self._parse_value(value)
+
+            config, op_changed = self._modify_key(
+                config,
+                key,
+                value,
+                ignore_not_found=ignore_not_found,
+                **key_operation_modes
+            )
+            changed |= op_changed
+        return config, changed
 
-                        # value is a simple list
-                        value = list(filter(lambda item: len(item), value.split(",")))
-                    except Exception:
-                        raise Exception(
-                            "Wrong value syntax - expected a comma separated list"
-                        )
+    def _parse_value(self, value):
+        """
+        Builds the yaml value of a kv out of its raw string (removals have no value to parse)
+        """
 
-            # now convert the value to yaml
-            value = helpers.convert_value_to_yaml(value)
+        # if value is actually a list (or dict), build a python list (or dict or list of dicts) out of it
+        if "{" in value:
+            try:
 
-            config, op_changed = self._modify_key(config, key, value, **mod_key_kwargs)
-            changed = changed | op_changed
-        return config, changed
+                # value is a dict or list of dicts
+                value = helpers.parse_inline_dicts(value)
+            except Exception:
+                raise Exception(
+                    "Wrong value syntax - expected either a dictionary or a list of dictionaries"
+                )
+        elif "," in value:
 
-    @staticmethod
-    def _enrich_level_index(level):
-        list_index_re = re.match("(?P<level>.*)\\[(?P<idx>.*)\\]", level)
-        if list_index_re is not None:
-            level = list_index_re.group("level")
-            idx = list_index_re.group("idx")
-            if idx.isdigit():
-                return level, int(idx)
-            return level, idx
-        return level, None
+            # value is a simple list
+            value = [item for item in value.split(",") if item]
+
+        # now convert the value to yaml
+        return helpers.convert_value_to_yaml(value, round_trip=self._round_trip)
 
     def _modify_key(
         self,
@@ -321,66 +433,57 @@ class Relayer(object):
         Adds a key to the config. if exists overrides, else adds
         """
 
-        def _get_subsection(section, key, section_idx):
+        def _locate(section, key, section_idx):
             """
-            An auxiliary function
+            Finds where key lives in section, in a single pass (the first match - levels that
+            several elements of an unindexed list match are walked per element, see _walk_each)
+            :returns: (container, container_key) such that container[container_key] is the
+                      requested subsection, or (None, None) if it wasn't found
             """
             if isinstance(section, dict):
                 if key in section:
-                    return section[key], None
-            if isinstance(section, list):
+                    return section, key
+            elif isinstance(section, list):
                 if section_idx == self.ListIndices.start:
                     section_idx = 0
                 elif section_idx == self.ListIndices.end:
                     section_idx = len(section) - 1
-                for idx, element in enumerate(section):
-                    if element == key and (idx == section_idx or section_idx is None):
-                        return section[idx], idx
 
-                    # it's a key in a 1-dict element in the list
-                    if (
-                        isinstance(element, dict)
-                        and key in element
-                        and (idx == section_idx or section_idx is None)
-                    ):
-                        return section[idx][key], idx
-            return None, None
+                # a direct index, no need to scan the list
+                if isinstance(section_idx, int):
+                    if not 0 <= section_idx < len(section):
+                        return None, None
+                    indices = [section_idx]
+                elif section_idx is None:
+                    indices = range(len(section))
+                else:
+                    return None, None
 
-        def _assign_subsection(section, key, subsection, section_idx=None):
-            """
-            An auxiliary function
-            """
-            if isinstance(section, dict):
-                if key in section:
-                    section[key] = subsection
-            elif isinstance(section, list):
-                if section_idx == self.ListIndices.start:
-                    section_idx = 0
-                elif section_idx == self.ListIndices.end:
-                    section_idx = len(section) - 1
-                for idx, element in enumerate(section):
-                    if element == key and (idx == section_idx or section_idx is None):
-                        section[idx] = subsection
+                for idx in indices:
+                    element = section[idx]
+                    if element == key:
+                        return section, idx
 
                     # it's a key in a 1-dict element in the list
-                    if (
-                        isinstance(element, dict)
-                        and key in element
-                        and (idx == section_idx or section_idx is None)
-                    ):
-                        section[idx][key] = subsection
-            return section
+                    if isinstance(element, dict) and key in element:
+                        return element, key
+            return None, None
 
         def _handle_extend_list(section, level, level_idx):
-            extend_value = helpers.as_list(value)
-            self._logger.debug("Extending list", list=level, idx=level_idx)
+            if self._debug_enabled:
+                self._logger.debug("Extending list", list=level, idx=level_idx)
             if level_idx == self.ListIndices.start:
+                extend_value = list(helpers.as_iter(value))
                 extend_value.extend(section[level])
                 return extend_value
             elif isinstance(level_idx, int):
-                section[level][level_idx:level_idx] = extend_value
+
+                # an index past the end extends the end (ruamel's sequences would insert the
+                # values of an out of range slice in reverse order)
+                level_idx = min(level_idx, len(section[level]))
+                section[level][level_idx:level_idx] = helpers.as_iter(value)
             elif level_idx is None or level_idx == "":
-                section[level].extend(extend_value)
+                section[level].extend(helpers.as_iter(value))
             else:
                 raise ValueError("List index has invalid value: {0}".format(level_idx))
 
@@ -394,15 +497,17 @@ class Relayer(object):
 
             # append to list
             if level_idx == self.ListIndices.start:
-                self._logger.debug(
-                    "Appending to start of list", list=level, idx=level_idx
-                )
+                if self._debug_enabled:
+                    self._logger.debug(
+                        "Appending to start of list", list=level, idx=level_idx
+                    )
                 section[level].insert(0, value)
                 return
             if level_idx == self.ListIndices.end:
-                self._logger.debug(
-                    "Appending to end of list", list=level, idx=level_idx
-                )
+                if self._debug_enabled:
+                    self._logger.debug(
+                        "Appending to end of list", list=level, idx=level_idx
+                    )
                 section[level].append(value)
                 return
 
@@ -411,12 +516,14 @@ class Relayer(object):
                 if isinstance(level_idx, int) and level_idx > len(section[level]):
                     self._logger.warn("index out of range", key=level, idx=level_idx)
                     raise IndexError("index out of range")
-                self._logger.debug("Inserting to list", list=level, idx=level_idx)
+                if self._debug_enabled:
+                    self._logger.debug("Inserting to list", list=level, idx=level_idx)
                 section[level].insert(level_idx, value)
                 return
 
             # change item in list
-            self._logger.debug("Setting value on a list", list=level, idx=level_idx)
+            if self._debug_enabled:
+                self._logger.debug("Setting value on a list", list=level, idx=level_idx)
             section[level][level_idx] = value
 
         def _handle_insert_in_section(section, level, level_idx, scope):
@@ -434,16 +541,17 @@ class Relayer(object):
                 return _handle_extend_list(section, level, level_idx)
 
             # direct insert value (not list) by returning
-            self._logger.debug(
-                "Setting value on an existing leaf", key=level, value=value
-            )
+            if self._debug_enabled:
+                self._logger.debug(
+                    "Setting value on an existing leaf", key=level, value=value
+                )
             return value
 
         def _handle_rm_by_value(section, level, rm_value):
 
             # try loading value as json dict for complex value removals
             try:
-                rm_value = simplejson.loads(rm_value)
+                rm_value = json.loads(rm_value)
             except ValueError:
 
                 # value isn't json
@@ -451,9 +559,10 @@ class Relayer(object):
                     self._logger.info("Element not found in list", element=rm_value)
                     return
 
-                self._logger.debug(
-                    "Removing element from list", key=level, element=rm_value
-                )
+                if self._debug_enabled:
+                    self._logger.debug(
+                        "Removing element from list", key=level, element=rm_value
+                    )
                 section[level].remove(rm_value)
 
             else:
@@ -482,9 +591,10 @@ class Relayer(object):
 
                 # rm by index
                 if isinstance(section[level], list):
-                    self._logger.debug(
-                        "Removing element from list", key=level, idx=level_idx
-                    )
+                    if self._debug_enabled:
+                        self._logger.debug(
+                            "Removing element from list", key=level, idx=level_idx
+                        )
                     if ignore_not_found and len(section[level]) < level_idx:
                         self._logger.warn(
                             "Requested index to remove is out of range, ignoring.",
@@ -496,116 +606,101 @@ class Relayer(object):
                     return
 
             # remove entire level
-            self._logger.debug("Removing key", key=level)
+            if self._debug_enabled:
+                self._logger.debug("Removing key", key=level)
             section.pop(level)
 
-        def update_section(section, requested_levels, scope, section_idx=None):
+        def _replace_section(config, section_holder, new_section):
             """
-            Main recursion function, returns a mutated copy of section and a boolean indicating a change was made
+            Puts new_section where the section it replaces is held (a leaf coerced into a dict)
+            :returns: The config root, which is new_section itself if the root was replaced
             """
-            self._logger.verbose(
-                "update_section() called",
-                section=section,
-                requested_levels=requested_levels,
-                scope=scope,
-            )
-            has_changed = False
-            level = requested_levels[0]
+            if section_holder is None:
+                return new_section
 
-            # Get index from level - if level is a list with a following index in square brackets
-            level, level_idx = self._enrich_level_index(level)
+            holder_container, holder_key = section_holder
+            holder_container[holder_key] = new_section
+            return config
 
-            # idx only used if section is list
-            subsection, idx = _get_subsection(section, level, section_idx)
+        def _matching_indices(section, key, section_idx):
+            """
+            The indices of the elements key matches (the element itself, or a key in a dict
+            element), when section is an unindexed list. Empty otherwise
+            """
+            if section_idx is not None or not isinstance(section, list):
+                return ()
 
-            self._logger.verbose(
-                "Got subsection",
-                section=section,
-                subsection=subsection,
-                idx=idx,
-                level=level,
-                level_index=level_idx,
-            )
+            return [
+                idx
+                for idx, element in enumerate(section)
+                if element == key or (isinstance(element, dict) and key in element)
+            ]
 
-            # reached final level, setting leaf value
-            if len(requested_levels) == 1:
+        def _walk_each(section, levels, indices, scope):
+            """
+            Applies the operation at levels to each of the list section's elements at indices
+            :returns: Whether any of them was changed
+            """
+            nonlocal value
+            has_changed = False
 
-                # new dict key / list element. mutate section directly
-                if subsection is None:
-                    if not append_mode:
-                        self._logger.warn(
-                            "Key not found in dict", key=level, at=".".join(scope)
-                        )
-                        if rm_mode and ignore_not_found:
-                            return section, False
-                        raise RuntimeError("Key not found in dict")
-
-                    new_value = value
-                    if level_idx in [self.ListIndices.start, self.ListIndices.end, 0]:
-                        new_value = helpers.as_list(value)
-                    elif level_idx is not None:
-                        self._logger.warn(
-                            "List doesn't exist", key=level, at=".".join(scope)
-                        )
-                        raise RuntimeError("List doesn't exist")
+            # last to first, so removed elements don't shift the indices left to walk
+            for idx in reversed(indices):
+                _, changed = _walk(section, levels, idx, list(scope))
+                has_changed |= changed
 
-                    self._logger.debug(
-                        "Adding key",
-                        key=level,
-                        value=new_value,
-                        at=".".join(scope),
-                        section=section,
-                        _type=section.__class__.__name__,
-                    )
+                # each element gets its own copy of the value (shared ones are dumped as anchors)
+                value = copy.deepcopy(value)
+            return has_changed
 
-                    if isinstance(section, dict):
-                        section[level] = new_value
-                    elif isinstance(section, list):
-                        section.append({level: new_value})
+        def _walk(config, levels, section_idx, scope):
+            """
+            Applies the operation to the config at the given levels (section_idx indexes config,
+            when it's a list)
+            :returns: (config, has_changed) - config is replaced if its root was a leaf
+            """
+            section = config
+            has_changed = False
 
-                    # section was some leaf (str/int)
-                    else:
-                        self._logger.debug(
-                            "Coercing level to dict",
-                            key=level,
-                            at=".".join(scope),
-                            section=section,
-                            _type=section.__class__.__name__,
-                        )
-                        section = {str(section): {level: new_value}}
-                    has_changed = True
+            # (container, container_key) holding the current section, None for the config root
+            section_holder = None
 
-                # subsection is not None, modifying existing leaf
-                else:
-                    ignored_missing_key = False
-                    if rm_mode:
-                        ignored_missing_key = _handle_rm_from_section(
-                            section, level, level_idx, scope
-                        )
+            # walk (and create, if needed) the sections down to the last level
+            for level_num, level in enumerate(levels[:-1]):
+                if self._verbose_enabled:
+                    self._logger.verbose(
+                        "Walking config level",
+                        section=section,
+                        level=level,
+                        scope=scope,
+                    )
 
-                    else:
+                # Get index from level - if level is a list with a following index in square brackets
+                level, level_idx = _enrich_level_index(level)
 
-                        # subsection is the existing value
-                        if subsection != value:
-                            direct_insert = _handle_insert_in_section(
-                                section, level, level_idx, scope
-                            )
-                            if direct_insert is not None:
-                                subsection = direct_insert
-
-                    # if ignored missing key, subsection was not changed and no need to rewrite it
-                    # otherwise, a key was removed or inserted - assign the changed subsection and
-                    # return the section was changed.
-                    has_changed = not ignored_missing_key
-                    if has_changed:
-                        section = _assign_subsection(
-                            section, level, subsection, section_idx
-                        )
+                # a level that several elements of an unindexed list match applies to all of them
+                matching_indices = _matching_indices(section, level, section_idx)
+                if len(matching_indices) > 1:
+                    has_changed |= _walk_each(
+                        section, levels[level_num:], matching_indices, scope
+                    )
+                    return config, has_changed
 
-            # we need to go deeper
-            else:
+                # container is the section itself, or the list element holding level
+                container, container_key = _locate(section, level, section_idx)
+                subsection = None if container is None else container[container_key]
 
-                # new dict for the requested_levels
+                if self._verbose_enabled:
+                    self._logger.verbose(
+                        "Got subsection",
+                        section=section,
+                        subsection=subsection,
+                        container_key=container_key,
+                        level=level,
+                        level_index=level_idx,
+                    )
+
+                # new dict for the rest of the levels
                 if subsection is None:
                     if not append_mode:
                         self._logger.warn(
@@ -616,40 +711,41 @@ class Relayer(object):
                         raise RuntimeError("Subsection not found in dict")
 
                     if isinstance(section, dict):
-                        self._logger.debug(
-                            "Creating subsection object",
-                            object=level,
-                            at=".".join(scope),
-                        )
-                        section.update({level: {}})
-                        section[level], changed = update_section(
-                            section[level], requested_levels[1:], scope + [level]
-                        )
+                        if self._debug_enabled:
+                            self._logger.debug(
+                                "Creating subsection object",
+                                object=level,
+                                at=".".join(scope),
+                            )
+                        section[level] = {}
+                        container, container_key = section, level
                     elif isinstance(section, list):
-                        self._logger.debug(
-                            "Creating sublist object", object=level, at=".".join(scope)
-                        )
+                        if self._debug_enabled:
+                            self._logger.debug(
+                                "Creating sublist object",
+                                object=level,
+                                at=".".join(scope),
+                            )
                         section.append({level: {}})
-                        section[-1][level], changed = update_section(
-                            section[-1][level], requested_levels[1:], scope + [level]
-                        )
+                        container, container_key = section[-1], level
 
                     # section was a leaf in itself
                     else:
-                        self._logger.debug(
-                            "Creating subsection where a leaf once was",
-                            section=section,
-                            object=level,
-                            at=".".join(scope),
-                        )
+                        if self._debug_enabled:
+                            self._logger.debug(
+                                "Creating subsection where a leaf once was",
+                                section=section,
+                                object=level,
+                                at=".".join(scope),
+                            )
 
                         key = str(section)
-                        section = {key: {level: {}}}
-                        section[key][level], changed = update_section(
-                            section[key][level], requested_levels[1:], scope + [level]
-                        )
+                        new_section = {key: {level: {}}}
+                        config = _replace_section(config, section_holder, new_section)
+                        container, container_key = new_section[key], level
 
                     has_changed = True
+                    section_idx = None
 
                 # subsection not None, existing keys
                 else:
@@ -666,60 +762,174 @@ class Relayer(object):
                                 "Leaf was found where subsection expected"
                             )
 
-                        else:
+                        if self._debug_enabled:
                             self._logger.debug(
                                 "Overriding existing element with new subsection",
                                 at=section,
                                 subsection=subsection,
-                                next_levels=requested_levels[1:],
+                                level=level,
                             )
 
-                            subsection = {level: {}}
-                            has_changed = True
+                        container[container_key] = {level: {}}
+                        has_changed = True
 
-                    # mutate subsection
-                    subsection, changed = update_section(
-                        subsection, requested_levels[1:], scope + [level], level_idx
+                    section_idx = level_idx
+
+                section_holder = (container, container_key)
+                section = container[container_key]
+                scope.append(level)
+
+            # reached final level, setting leaf value
+            level, level_idx = _enrich_level_index(levels[-1])
+            matching_indices = _matching_indices(section, level, section_idx)
+            if len(matching_indices) > 1:
+                has_changed |= _walk_each(section, levels[-1:], matching_indices, scope)
+                return config, has_changed
+
+            container, container_key = _locate(section, level, section_idx)
+            subsection = None if container is None else container[container_key]
+
+            if self._verbose_enabled:
+                self._logger.verbose(
+                    "Got leaf",
+                    section=section,
+                    subsection=subsection,
+                    container_key=container_key,
+                    level=level,
+                    level_index=level_idx,
+                )
+
+            # new dict key / list element. mutate section directly
+            if subsection is None:
+                if not append_mode:
+                    self._logger.warn(
+                        "Key not found in dict", key=level, at=".".join(scope)
+                    )
+                    if rm_mode and ignore_not_found:
+                        return config, has_changed
+                    raise RuntimeError("Key not found in dict")
+
+                new_value = value
+                if level_idx in [self.ListIndices.start, self.ListIndices.end, 0]:
+                    new_value = helpers.as_list(value)
+                elif level_idx is not None:
+                    self._logger.warn(
+                        "List doesn't exist", key=level, at=".".join(scope)
                     )
-                    has_changed |= changed
+                    raise RuntimeError("List doesn't exist")
 
-                    section = _assign_subsection(
-                        section, level, subsection, section_idx
+                if self._debug_enabled:
+                    self._logger.debug(
+                        "Adding key",
+                        key=level,
+                        value=new_value,
+                        at=".".join(scope),
+                        section=section,
+                        _type=section.__class__.__name__,
                     )
 
-            return section, has_changed
+                if isinstance(section, dict):
+                    section[level] = new_value
+                elif isinstance(section, list):
+                    section.append({level: new_value})
 
-        # split dict levels by '.' only, and clean up the escaping for the rest of the flow
-        levels = [
-            level.replace("\\.", ".") for level in re.split(r"(?<!\\)\.", full_key)
-        ]
-        return update_section(config, levels, [])
+                # section was some leaf (str/int)
+                else:
+                    if self._debug_enabled:
+                        self._logger.debug(
+                            "Coercing level to dict",
+                            key=level,
+                            at=".".join(scope),
+                            section=section,
+                            _type=section.__class__.__name__,
+                        )
+                    config = _replace_section(
+                        config, section_holder, {str(section): {level: new_value}}
+                    )
+                has_changed = True
+
+            # subsection is not None, modifying existing leaf
+            elif rm_mode:
+
+                # removals mutate the container in place, nothing to reassign
+                ignored_missing_key = _handle_rm_from_section(
+                    container, container_key, level_idx, scope
+                )
+
+                # if ignored missing key, the section was not changed
+                has_changed |= not ignored_missing_key
+
+            else:
+
+                # subsection is the existing value
+                if subsection != value:
+                    direct_insert = _handle_insert_in_section(
+                        container, container_key, level_idx, scope
+                    )
+                    if direct_insert is not None:
+                        subsection = direct_insert
+
+                container[container_key] = subsection
+                has_changed = True
+
+            return config, has_changed
+
+        return _walk(config, _split_key(full_key), None, [])
 
     def _merge_configs(self, config_a, config_b_filepath):
         self._logger.info("Merging with request file", file_path=config_b_filepath)
+
+        # loaded like the config, as its values are written back with it
         config_b = self._load_config(config_b_filepath)
+
+        # nothing new to merge - spare the caller from rewriting the config
+        if not config_b or self._is_subset(config_b, config_a):
+            self._logger.info("Request file is already contained in config")
+            return config_a, False
+
         config_a = self._deep_merge_dicts(config_a, config_b)
         return config_a, True
 
+    @staticmethod
+    def _is_subset(d1, d2):
+        """
+        Checks whether merging dict a into dict b would leave b as is (every key of a exists in b,
+        with the same value or a dict contained in b's value)
+        """
+        dicts_to_check = [(d1, d2)]
+        while dicts_to_check:
+            subset, superset = dicts_to_check.pop()
+            for key, subset_value in subset.items():
+                if key not in superset:
+                    return False
+
+                superset_value = superset[key]
+                if isinstance(superset_value, dict) and isinstance(subset_value, dict):
+                    dicts_to_check.append((subset_value, superset_value))
+                elif superset_value != subset_value:
+                    return False
+        return True
+
     def _deep_merge_dicts(self, d1, d2):
         """
-        Recursively merges dict b into a [mutates a in-place].
+        Merges dict b into a [mutates a in-place], walking nested dicts with an explicit stack.
         NOTE: overriding with b values if any conflicts occur, consistent with dict.update()
         """
-        for key in d2:
-            if key in d1:
-                if isinstance(d1[key], dict) and isinstance(d2[key], dict):
-                    self._deep_merge_dicts(d1[key], d2[key])
-
-                # same leaf value
-                elif d1[key] == d2[key]:
-                    pass
-
-                # override a's value with b's value
-                else:
-                    d1[key] = d2[key]
-
-            # adding b's value to the new dict
-            else:
-                d1[key] = d2[key]
+        dicts_to_merge = [(d1, d2)]
+        while dicts_to_merge:
+            target, source = dicts_to_merge.pop()
+            for key, source_value in source.items():
+
+                # adding b's value to the new dict
+                if key not in target:
+                    target[key] = source_value
+                    continue
+
+                target_value = target[key]
+                if isinstance(target_value, dict) and isinstance(source_value, dict):
+                    dicts_to_merge.append((target_value, source_value))
+
+                # override a's value with b's value (same leaf values are kept as is)
+                elif target_value != source_value:
+                    target[key] = source_value
         return d1
@@ -12,57 +12,242 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import re
+
 import ruamel.yaml
 import ruamel.yaml.scalarstring
 
+# digits, optionally grouped by single underscores (as accepted by int() / float())
+_DIGITS = r"\d(?:_?\d)*"
+
+# values convertible by int() / float(), classified up front instead of by trial and error
+_INT_RE = re.compile(r"[+-]?{0}\Z".format(_DIGITS))
+_FLOAT_RE = re.compile(
+    r"[+-]?(?:(?:(?:{0})?\.{0}|{0}\.?)(?:[eE][+-]?{0})?|inf|infinity|nan)\Z".format(
+        _DIGITS
+    ),
+    re.IGNORECASE,
+)
+
+# words converted to booleans (case insensitive)
+_BOOL_VALUES = {
+    "true": True,
+    "t": True,
+    "y": True,
+    "yes": True,
+    "false": False,
+    "f": False,
+    "n": False,
+    "no": False,
+}
+
+# values that are already typed, and are left as is
+_TYPED_VALUE_TYPES = (bool, int, float, type(None))
+
+# bound once, instead of resolving the attribute chain per quoted value
+_SingleQuotedScalarString = ruamel.yaml.scalarstring.SingleQuotedScalarString
+
 
 def as_list(element):
     """
-    If element is not a list, makes it a list whose only entry is element.
-    If it's already a list, returns it as is
+    If element is not a list, makes it a list whose only entry is element (a tuple's entries).
+    If it's already a list, returns it as is. Callers that only iterate over the result should
+    use as_iter instead, which never allocates a list
 
     :param element: The element to listify
     :type element: object
     :return: list
     """
-    return element if isinstance(element, list) else [element]
-
-
-def convert_value_to_yaml(value):
-    def try_convert_to_bool(inner_value):
-        if str(inner_value).lower() in ["true", "t", "y", "yes"]:
-            return True
-        if str(inner_value).lower() in ["false", "f", "n", "no"]:
-            return False
-        raise ValueError("Value is not boolean-convertable")
-
-    def single_value_convert(inner_value):
-        if inner_value is None:
-            return inner_value
-
-        inner_value = inner_value.strip()
-        try:
-            return int(inner_value)
-        except ValueError:
-            try:
-                return float(inner_value)
-            except ValueError:
-                try:
-                    return try_convert_to_bool(inner_value)
-                except ValueError:
-                    return ruamel.yaml.scalarstring.SingleQuotedScalarString(
-                        inner_value
-                    )
+    if isinstance(element, list):
+        return element
+    if isinstance(element, tuple):
+        return list(element)
+    return [element]
 
-    if isinstance(value, list):
-        for idx, k in enumerate(value):
-            value[idx] = convert_value_to_yaml(k)
+
+def as_iter(element):
+    """
+    If element is not a list / tuple, makes it a tuple whose only entry is element.
+    If it is, returns it as is (read-only counterpart of as_list)
+
+    :param element: The element to iterate over
+    :type element: object
+    :return: list or tuple
+    """
+    if isinstance(element, (list, tuple)):
+        return element
+    return (element,)
+
+
+def parse_inline_dicts(value):
+    """
+    Parses a string of inline dicts (e.g. {aa:bb},{cc:dd,kk:ll}) into a list of dicts, in a single
+    pass over its characters. Values that follow a key without a colon of their own are
+    gathered, together with the key's value, into a list (e.g. {aa:bb,cc,dd} -> aa: [bb, cc, dd])
+
+    :param value: The string to parse
+    :type value: str
+    :return: list
+    """
+    dicts = []
+    current_dict = None
+    current_key = None
+    token_start = 0
+    colon_idx = -1
+
+    for idx, char in enumerate(value):
+
+        # between dicts, only separating commas (and whitespace) are allowed
+        if current_dict is None:
+            if char == "{":
+                current_dict = {}
+                current_key = None
+                token_start = idx + 1
+                colon_idx = -1
+            elif char != "," and not char.isspace():
+                raise ValueError(
+                    "Unexpected character outside of a dict: {0}".format(char)
+                )
+            continue
+
+        if char == ":" and colon_idx == -1:
+            colon_idx = idx
+        elif char == "," or char == "}":
+
+            # a new key and its value
+            if colon_idx != -1:
+                current_key = value[token_start:colon_idx]
+                current_dict[current_key] = value[colon_idx + 1 : idx]
+
+            # another value of the last key
+            elif current_key is not None:
+                token = value[token_start:idx]
+                previous_value = current_dict[current_key]
+                if isinstance(previous_value, list):
+                    previous_value.append(token)
+                else:
+                    current_dict[current_key] = [previous_value, token]
+
+            # allow empty dicts, but not values without a key
+            elif char == "," or token_start != idx:
+                raise ValueError("Value without a key in dict")
+
+            token_start = idx + 1
+            colon_idx = -1
+            if char == "}":
+                dicts.append(current_dict)
+                current_dict = None
+        elif char == "{":
+            raise ValueError("Nested dicts are not supported")
+
+    if current_dict is not None:
+        raise ValueError("Dict is missing a closing bracket")
+
+    return dicts
+
+
+def _convert_single_value(value, round_trip):
+    """
+    Converts a single raw value to its yaml typed value (see convert_value_to_yaml)
+    """
+    if isinstance(value, _TYPED_VALUE_TYPES):
         return value
 
-    if isinstance(value, dict):
-        converted_value = {}
-        for k, v in value.items():
-            converted_value[convert_value_to_yaml(k)] = convert_value_to_yaml(v)
-        return converted_value
+    value = value.strip()
+    if _INT_RE.match(value):
+        return int(value)
+    if _FLOAT_RE.match(value):
+        return float(value)
+
+    bool_value = _BOOL_VALUES.get(value.lower())
+    if bool_value is not None:
+        return bool_value
+
+    if not round_trip:
+        return value
+    return _SingleQuotedScalarString(value)
+
+
+def convert_value_to_yaml(value, round_trip=True):
+    """
+    Converts a raw value (or a list / dict of raw values) to its yaml typed value - ints, floats
+    and booleans are converted, other strings are single quoted when round tripping (otherwise
+    they're left plain, and the safe dumper quotes them where needed)
+
+    :param value: The value to convert
+    :type value: str, list or dict
+    :param round_trip: Whether the value is dumped by the round-trip dumper
+    :type round_trip: bool
+    :return: object
+    """
+
+    # most values are a single scalar
+    if not isinstance(value, (list, dict)):
+        return _convert_single_value(value, round_trip)
+
+    # lists are converted in place, dicts are rebuilt with converted keys. nested values are
+    # walked with an explicit stack of (holder, key) pairs, the root held by a single item list
+    root = [value]
+    values_to_convert = [(root, 0)]
+    while values_to_convert:
+        holder, key = values_to_convert.pop()
+        inner_value = holder[key]
+
+        converter = _VALUE_CONVERTERS.get(type(inner_value))
+        if converter is None:
+            converter = _get_value_converter(inner_value)
 
-    return single_value_convert(value)
+        values_to_convert.extend(converter(holder, key, inner_value, round_trip))
+
+    return root[0]
+
+
+def _convert_list_value(holder, key, value, round_trip):
+    """
+    Returns the (holder, key) pairs of the list's items to convert (converted in place)
+    """
+    return (
+        (value, idx)
+        for idx, item in enumerate(value)
+        if not isinstance(item, _TYPED_VALUE_TYPES)
+    )
+
+
+def _convert_dict_value(holder, key, value, round_trip):
+    """
+    Replaces the dict with one of converted keys, and returns the (holder, key) pairs of its
+    values to convert
+    """
+    converted_value = {
+        _convert_single_value(k, round_trip): v for k, v in value.items()
+    }
+    holder[key] = converted_value
+    return (
+        (converted_value, k)
+        for k, v in converted_value.items()
+        if not isinstance(v, _TYPED_VALUE_TYPES)
+    )
+
+
+def _convert_leaf_value(holder, key, value, round_trip):
+    """
+    Replaces the value with its converted value (leaves have nothing more to convert)
+    """
+    holder[key] = _convert_single_value(value, round_trip)
+    return ()
+
+
+# converters by exact value type, anything else is a leaf unless it subclasses list / dict
+_VALUE_CONVERTERS = {
+    list: _convert_list_value,
+    dict: _convert_dict_value,
+    str: _convert_leaf_value,
+}
+
+
+def _get_value_converter(value):
+    if isinstance(value, list):
+        return _convert_list_value
+    if isinstance(value, dict):
+        return _convert_dict_value
+    return _convert_leaf_value
@@ -19,10 +19,7 @@ import sys
 import traceback
 import argparse
 
-from twisted.internet import defer, reactor
-
 import clients.logging
-import core
 
 
 def enrich_args(run_args):
@@ -36,18 +33,20 @@ def enrich_args(run_args):
 
 
 def _run(run_args):
+
+    # imported only once the args are parsed, so --help and bad args don't pay for it
+    import core
+
     retval = 1
 
-    def _on_exception(failure):
+    def _on_exception(exc):
         try:
 
             # adding an error will set logger.first_error if it's not already set
-            logger.error("Relayer failed with exception", exc=str(failure))
+            logger.error("Relayer failed with exception", exc=str(exc))
         except Exception as exc2:
             traceback.print_exc()
             print("Relayer failed, and error logging failed. exc={0}".format(exc2))
-        finally:
-            reactor.callFromThread(reactor.stop)
 
     try:
         logger = clients.logging.Client(
@@ -60,10 +59,15 @@ def _run(run_args):
             log_file_name=run_args.log_file_name,
             log_colors=run_args.log_colors,
         ).logger
-        rlr = core.Relayer(logger, run_args.config, run_args.debug)
+        rlr = core.Relayer(
+            logger,
+            run_args.config,
+            run_args.debug,
+            round_trip=not run_args.fast,
+        )
 
-        d = defer.maybeDeferred(
-            rlr.relayer_config,
+        # relayer_config is synchronous - no need for a reactor to run it
+        rlr.relayer_config(
             run_args.add,
             run_args.rm,
             run_args.update,
@@ -74,12 +78,6 @@ def _run(run_args):
             run_args.ignore_not_found,
         )
 
-        # after run
-        # d.addBoth(lambda _: reactor.callFromThread(reactor.stop))
-        d.addCallbacks(lambda _: reactor.callFromThread(reactor.stop), _on_exception)
-
-        reactor.run()
-
         if logger.first_error is None:
             retval = 0
 
@@ -89,7 +87,7 @@ def _run(run_args):
     return retval
 
 
-if __name__ == "__main__":
+def _build_parser():
     parser = argparse.ArgumentParser(prog="Relayer")
 
     # add logging args
@@ -106,6 +104,17 @@ if __name__ == "__main__":
         action="store_true",
     )
 
+    parser.add_argument(
+        "-f",
+        "--fast",
+        "-fe",
+        "--fast-emit",
+        help="Load and rewrite the config with the safe (non round-trip) loader and dumper, "
+        "with or without --debug. Comments, anchors, merge keys and the original quoting and number "
+        "formats are not preserved.",
+        action="store_true",
+    )
+
     parser.add_argument(
         "-a",
         "--add",
@@ -183,7 +192,11 @@ if __name__ == "__main__":
         action="store_true",
     )
 
-    args = parser.parse_args()
+    return parser
+
+
+if __name__ == "__main__":
+    args = _build_parser().parse_args()
     retval = _run(enrich_args(args))
 
     # return value
@@ -13,13 +13,18 @@
 # limitations under the License.
 #
 import os
+import mmap
+import shlex
 import shutil
+import tempfile
 from ruamel import yaml
 
 from twisted.internet import defer
 
 import tests.integration
 import framework.common.helpers
+import tools.relayer.core
+import tools.relayer.clients.logging
 
 """
 This integration test uses zebo's test infrastructure
@@ -27,6 +32,13 @@ This integration test uses zebo's test infrastructure
 
 
 class RelayerTestCase(tests.integration.TestCase):
+
+    # for relayer runs done in-process
+    _relayer_logger = tools.relayer.clients.logging.Client(
+        "relayer",
+        initial_severity=tools.relayer.clients.logging.Severity.Info,
+    ).logger
+
     def __init__(self, *args, **kwargs):
         super(RelayerTestCase, self).__init__(*args, **kwargs)
         self._modifiable_file_path = None
@@ -43,12 +55,17 @@ class RelayerTestCase(tests.integration.TestCase):
                 )
             )
 
-        # we create a modifiable file out of the original one, to test on it and in the end remove it
+        # we create a modifiable file out of the original one, to test on it and in the end remove it.
+        # each test gets its own uniquely named copy, so tests can run concurrently
         original_file_name = "relayer_test.yml"
-        modifiable_file_name = "relayer_test_copy.yml"
         original_file_path = get_path_to_file(original_file_name)
 
-        self._modifiable_file_path = get_path_to_file(modifiable_file_name)
+        modifiable_file_fd, self._modifiable_file_path = tempfile.mkstemp(
+            prefix="relayer_test_copy_",
+            suffix=".yml",
+            dir=os.path.dirname(original_file_path),
+        )
+        os.close(modifiable_file_fd)
 
         # auxiliary file (for --from-file updates)
         self._aux_file_path = get_path_to_file("relayer_aux_test.yml")
@@ -65,7 +82,6 @@ class RelayerTestCase(tests.integration.TestCase):
         if self._modifiable_file_path:
             os.unlink(self._modifiable_file_path)
 
-    @defer.inlineCallbacks
     def test_all_operations(self):
 
         # basic check
@@ -74,7 +90,7 @@ class RelayerTestCase(tests.integration.TestCase):
             r"{type:d.with.dots,dot.value:4}"
         )
 
-        yield self._run_relayer(
+        self._apply_relayer(
             self._modifiable_file_path,
             args_to_add=[
                 r"field_2.sub_field_0=123",
@@ -99,9 +115,13 @@ class RelayerTestCase(tests.integration.TestCase):
 
         resulting_config = self._relayer_config_yml_to_dict(self._modifiable_file_path)
 
-        self.assertEquals(resulting_config["field_2"]["sub_field_0"], 123)
-        self.assertEquals(resulting_config["field_0"]["sub_field_3"], "aa")
-        self.assertEquals(
+        field_1 = resulting_config["field_1"]
+        sub_field_0 = field_1["sub_field_0"]
+        sub_sub_sub_field_0 = sub_field_0["sub_sub_field_1"]["sub_sub_sub_field_0"]
+
+        self.assertEqual(resulting_config["field_2"]["sub_field_0"], 123)
+        self.assertEqual(resulting_config["field_0"]["sub_field_3"], "aa")
+        self.assertEqual(
             resulting_config["field_0"]["sub_field_5"],
             [
                 {"type": "a", "value": 2},
@@ -110,40 +130,20 @@ class RelayerTestCase(tests.integration.TestCase):
                 {"type": "d.with.dots", "dot.value": 4},
             ],
         )
-        self.assertEquals(
-            resulting_config["field_1"]["sub_field_1"]["dotted.sub.field_0"], "new"
-        )
-        self.assertEquals(resulting_config["field_0"]["sub_field_1"], [456, 54])
-        self.assertEquals(
-            resulting_config["field_1"]["sub_field_0"]["dotted.sub.field_2"], "modified"
-        )
+        self.assertEqual(field_1["sub_field_1"]["dotted.sub.field_0"], "new")
+        self.assertEqual(resulting_config["field_0"]["sub_field_1"], [456, 54])
+        self.assertEqual(sub_field_0["dotted.sub.field_2"], "modified")
         self.assertNotIn("sub_field_2", resulting_config["field_0"])
-        self.assertNotIn("sub_sub_field_0", resulting_config["field_1"]["sub_field_0"])
-        self.assertNotIn(
-            "dotted.sub.field_3", resulting_config["field_1"]["sub_field_0"]
-        )
-        self.assertNotIn(
-            "relay1_0",
-            resulting_config["field_1"]["sub_field_0"]["sub_sub_field_1"][
-                "sub_sub_sub_field_0"
-            ],
-        )
-        self.assertNotIn(
-            "relay1_1",
-            resulting_config["field_1"]["sub_field_0"]["sub_sub_field_1"][
-                "sub_sub_sub_field_0"
-            ],
-        )
-        self.assertIn(
-            "relay1_2",
-            resulting_config["field_1"]["sub_field_0"]["sub_sub_field_1"][
-                "sub_sub_sub_field_0"
-            ],
-        )
+        self.assertNotIn("sub_sub_field_0", sub_field_0)
+        self.assertNotIn("dotted.sub.field_3", sub_field_0)
+        self.assertNotIn("relay1_0", sub_sub_sub_field_0)
+        self.assertNotIn("relay1_1", sub_sub_sub_field_0)
+        self.assertIn("relay1_2", sub_sub_sub_field_0)
 
     @defer.inlineCallbacks
     def test_ignore_not_found(self):
 
+        # through the command, for -inf and its exit code
         yield self._run_relayer(
             self._modifiable_file_path,
             args_to_add=[
@@ -170,66 +170,59 @@ class RelayerTestCase(tests.integration.TestCase):
 
         resulting_config = self._relayer_config_yml_to_dict(self._modifiable_file_path)
 
-        self.assertEquals(resulting_config["field_2"]["sub_field_0"], 123)
-        self.assertEquals(
-            resulting_config["field_1"]["sub_field_1"]["dotted.sub.field_0"], "new"
-        )
-        self.assertEquals(resulting_config["field_0"]["sub_field_1"], [456, 54])
-        self.assertEquals(
-            resulting_config["field_1"]["sub_field_0"]["dotted.sub.field_2"], "modified"
-        )
+        field_1 = resulting_config["field_1"]
+        sub_field_0 = field_1["sub_field_0"]
+        sub_sub_sub_field_0 = sub_field_0["sub_sub_field_1"]["sub_sub_sub_field_0"]
+
+        self.assertEqual(resulting_config["field_2"]["sub_field_0"], 123)
+        self.assertEqual(field_1["sub_field_1"]["dotted.sub.field_0"], "new")
+        self.assertEqual(resulting_config["field_0"]["sub_field_1"], [456, 54])
+        self.assertEqual(sub_field_0["dotted.sub.field_2"], "modified")
         self.assertNotIn("sub_field_2", resulting_config["field_0"])
-        self.assertNotIn(
-            "dotted.sub.field_3", resulting_config["field_1"]["sub_field_0"]
-        )
-        self.assertNotIn(
-            "relay1_0",
-            resulting_config["field_1"]["sub_field_0"]["sub_sub_field_1"][
-                "sub_sub_sub_field_0"
-            ],
-        )
-        self.assertNotIn(
-            "relay1_1",
-            resulting_config["field_1"]["sub_field_0"]["sub_sub_field_1"][
-                "sub_sub_sub_field_0"
+        self.assertNotIn("dotted.sub.field_3", sub_field_0)
+        self.assertNotIn("relay1_0", sub_sub_sub_field_0)
+        self.assertNotIn("relay1_1", sub_sub_sub_field_0)
+
+        # none of these runs modify the file, so they can run side by side
+        failed_runs = yield defer.DeferredList(
+            [
+                self._run_relayer(
+                    self._modifiable_file_path,
+                    args_to_add=[
+                        r"field_2.sub_field_0=123",
+                        r"field_1.sub_field_1.dotted\.sub\.field_0=new",
+                    ],
+                    args_to_update=[
+                        r"field_0.sub_field_1=456,54",
+                        r"field_1.sub_field_0.dotted\.sub\.field_2=modified",
+                    ],
+                    args_to_remove=[
+                        r"field_0.does_not_exist",
+                    ],
+                    ignore_not_found=False,
+                ),
+                self._run_relayer(
+                    self._modifiable_file_path,
+                    args_to_remove=[
+                        r"field_1.sub_field_0.sub_sub_field_1.does_not_exist[0]",
+                    ],
+                    ignore_not_found=False,
+                ),
+                self._run_relayer(
+                    self._modifiable_file_path,
+                    args_to_remove_from_list=[
+                        r"field_1.sub_field_0.sub_sub_field_1.sub_sub_sub_field_0[relay1_1]",
+                        r"field_1.sub_field_0.sub_sub_field_1.does_not_exist[relay1_1]",
+                    ],
+                    ignore_not_found=False,
+                ),
             ],
+            consumeErrors=True,
         )
 
-        with self.assertRaises(framework.common.helpers.CommandFailedError):
-            yield self._run_relayer(
-                self._modifiable_file_path,
-                args_to_add=[
-                    r"field_2.sub_field_0=123",
-                    r"field_1.sub_field_1.dotted\.sub\.field_0=new",
-                ],
-                args_to_update=[
-                    r"field_0.sub_field_1=456,54",
-                    r"field_1.sub_field_0.dotted\.sub\.field_2=modified",
-                ],
-                args_to_remove=[
-                    r"field_0.does_not_exist",
-                ],
-                ignore_not_found=False,
-            )
-
-        with self.assertRaises(framework.common.helpers.CommandFailedError):
-            yield self._run_relayer(
-                self._modifiable_file_path,
-                args_to_remove=[
-                    r"field_1.sub_field_0.sub_sub_field_1.does_not_exist[0]",
-                ],
-                ignore_not_found=False,
-            )
-
-        with self.assertRaises(framework.common.helpers.CommandFailedError):
-            yield self._run_relayer(
-                self._modifiable_file_path,
-                args_to_remove_from_list=[
-                    r"field_1.sub_field_0.sub_sub_field_1.sub_sub_sub_field_0[relay1_1]",
-                    r"field_1.sub_field_0.sub_sub_field_1.does_not_exist[relay1_1]",
-                ],
-                ignore_not_found=False,
-            )
+        for succeeded, result in failed_runs:
+            self.assertFalse(succeeded)
+            result.trap(framework.common.helpers.CommandFailedError)
 
     @defer.inlineCallbacks
     def test_all_and_file_merge(self):
@@ -243,17 +236,17 @@ class RelayerTestCase(tests.integration.TestCase):
 
         resulting_config = self._relayer_config_yml_to_dict(self._modifiable_file_path)
 
-        self.assertEquals(resulting_config["field_0"]["sub_field_3"], "aa")
-        self.assertEquals(resulting_config["field_3"]["sub_field_0"], 123)
-        self.assertEquals(resulting_config["field_0"]["sub_field_1"], [456, 54])
+        self.assertEqual(resulting_config["field_0"]["sub_field_3"], "aa")
+        self.assertEqual(resulting_config["field_3"]["sub_field_0"], 123)
+        self.assertEqual(resulting_config["field_0"]["sub_field_1"], [456, 54])
         self.assertNotIn("sub_field_2", resulting_config["field_0"])
 
         # from the merge aux config
         self.assertIn("sub_sub_field_0", resulting_config["field_1"]["sub_field_0"])
-        self.assertEquals(
+        self.assertEqual(
             resulting_config["field_2"]["sub_field_0"]["sub_sub_field_0"], "ab"
         )
-        self.assertEquals(
+        self.assertEqual(
             resulting_config["field_1"]["sub_field_0"]["sub_sub_field_0"], "ab"
         )
 
@@ -268,7 +261,37 @@ class RelayerTestCase(tests.integration.TestCase):
 
         resulting_config = self._relayer_config_yml_to_dict(self._modifiable_file_path)
 
-        self.assertEquals(resulting_config["field_2"]["sub_field_0"], 123)
+        self.assertEqual(resulting_config["field_2"]["sub_field_0"], 123)
+
+    def _apply_relayer(
+        self,
+        config_path,
+        args_to_add=None,
+        args_to_update=None,
+        args_to_remove=None,
+        args_to_remove_from_list=None,
+        arg_to_file_merge=None,
+        ignore_not_found=False,
+    ):
+        """
+        Applies the args in-process, skipping argument parsing and exit codes - only for tests that
+        assert on the resulting config. Every operation is also run through the command by
+        _run_relayer in at least one test
+        """
+        self._logger.info("Applying relayer args", config_path=config_path)
+        relayer = tools.relayer.core.Relayer(
+            self._relayer_logger, os.path.abspath(config_path)
+        )
+        relayer.relayer_config(
+            add_kvs=args_to_add,
+            rm_keys=args_to_remove,
+            update_kvs=args_to_update,
+            extend_kvs=None,
+            insert_kvs=None,
+            rm_list_element_keys=args_to_remove_from_list,
+            file_path_to_merge=arg_to_file_merge,
+            ignore_not_found=ignore_not_found,
+        )
 
     @defer.inlineCallbacks
     def _run_relayer(
@@ -286,33 +309,39 @@ class RelayerTestCase(tests.integration.TestCase):
         relayer_path = os.path.abspath(
             os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../relayer")
         )
-        command = "{0} -c {1}".format(relayer_path, config_path)
+        argv = [relayer_path, "-c", config_path]
 
-        if args_to_add:
-            for arg_to_add in args_to_add:
-                command += ' -a "{0}"'.format(arg_to_add)
+        for arg_to_add in args_to_add or []:
+            argv += ["-a", arg_to_add]
 
-        if args_to_update:
-            for arg_to_update in args_to_update:
-                command += ' -u "{0}"'.format(arg_to_update)
+        for arg_to_update in args_to_update or []:
+            argv += ["-u", arg_to_update]
 
-        if args_to_remove:
-            for arg_to_remove in args_to_remove:
-                command += ' -r "{0}"'.format(arg_to_remove)
+        for arg_to_remove in args_to_remove or []:
+            argv += ["-r", arg_to_remove]
 
-        if args_to_remove_from_list:
-            for arg_to_remove_from_list in args_to_remove_from_list:
-                command += ' -rl "{0}"'.format(arg_to_remove_from_list)
+        for arg_to_remove_from_list in args_to_remove_from_list or []:
+            argv += ["-rl", arg_to_remove_from_list]
 
         if arg_to_file_merge:
-            command += " -ff {0}".format(arg_to_file_merge)
+            argv += ["-ff", arg_to_file_merge]
 
         if ignore_not_found:
-            command += " -inf"
+            argv.append("-inf")
+
+        # run_command takes a shell command line - quote each arg once, instead of by hand
+        command = " ".join(shlex.quote(arg) for arg in argv)
         self._logger.info("Running relayer command", comamnd=command)
         yield framework.common.helpers.run_command(command, logger=self._logger)
 
     @staticmethod
     def _relayer_config_yml_to_dict(config_path):
-        with open(config_path, "r") as f:
-            return yaml.load(f, Loader=yaml.Loader)
+        with open(config_path, "rb") as f:
+
+            # empty files can't be mapped (and hold no config)
+            if not os.fstat(f.fileno()).st_size:
+                return None
+
+            # parse the mapped bytes directly, without copying and decoding them first
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as config_contents:
+                return yaml.YAML(typ="safe").load(config_contents)
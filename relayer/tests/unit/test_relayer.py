@@ -13,7 +13,9 @@
 # limitations under the License.
 #
 import os
-import shutil
+import pickle
+import tempfile
+import functools
 from ruamel import yaml
 
 import tools.relayer.core
@@ -21,206 +23,264 @@ import tools.relayer.clients.logging
 
 from twisted.trial import unittest
 
+_FIXTURES_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "../fixtures")
+)
+_ORIGINAL_FIXTURE_PATH = os.path.join(_FIXTURES_DIR, "relayer_test.yml")
+_AUX_FIXTURE_PATH = os.path.join(_FIXTURES_DIR, "relayer_aux_test.yml")
+_ANCHORS_FIXTURE_PATH = os.path.join(_FIXTURES_DIR, "relayer_anchors_test.yml")
+
+# tmpfs mount, for the modifiable fixture copies
+_IN_MEMORY_DIR = "/dev/shm"
+
+_safe_yaml = yaml.YAML(typ="safe")
+
+
+@functools.lru_cache(maxsize=None)
+def _read_fixture(fixture_path):
+    """
+    Returns a fixture's contents and its parsed config, pickled - fixtures are never modified, so
+    each is read once per run, and callers unpickle a fresh copy they may mutate
+    """
+    with open(fixture_path, "rb") as f:
+        contents = f.read()
+
+    return contents, pickle.dumps(
+        _safe_yaml.load(contents), protocol=pickle.HIGHEST_PROTOCOL
+    )
+
+
+# tests log errors only, unless RELAYER_TEST_QUIET=0 (then they narrate verbosely)
+_QUIET = os.environ.get("RELAYER_TEST_QUIET", "1") == "1"
+
 
 class RelayerTestCase(unittest.TestCase):
     _logger = tools.relayer.clients.logging.Client(
         "relayer",
         log_colors="always",
-        initial_severity=tools.relayer.clients.logging.Severity.Verbose,
+        initial_severity=(
+            tools.relayer.clients.logging.Severity.Error
+            if _QUIET
+            else tools.relayer.clients.logging.Severity.Verbose
+        ),
     ).logger
 
+    _relayer = None
+
+    # relayer_config args that tests don't pass
+    _relayer_config_defaults = {
+        "add_kvs": None,
+        "rm_keys": None,
+        "update_kvs": None,
+        "extend_kvs": None,
+        "insert_kvs": None,
+        "rm_list_element_keys": None,
+        "file_path_to_merge": None,
+    }
+
     def setUp(self):
-        def get_path_to_file(file_name):
-            return os.path.abspath(
-                os.path.join(
-                    os.path.dirname(os.path.abspath(__file__)),
-                    "../fixtures/{0}".format(file_name),
-                )
-            )
 
         # we create a modifiable file out of the original one, to test on it and in the end remove it
-        original_file_name = "relayer_test.yml"
         modifiable_file_name = "relayer_test_copy.yml"
-        original_file_path = get_path_to_file(original_file_name)
+        original_file_path = _ORIGINAL_FIXTURE_PATH
 
         # auxiliary file (for --from-file updates)
-        self._aux_file_path = get_path_to_file("relayer_aux_test.yml")
-
-        # make a modifiable copy of the yml fixture
-        self._modifiable_file_path = get_path_to_file(modifiable_file_name)
-        shutil.copyfile(original_file_path, self._modifiable_file_path)
+        self._aux_file_path = _AUX_FIXTURE_PATH
 
-        self._original_config_dict = self._relayer_config_yml_to_dict(
-            self._modifiable_file_path
+        # make a modifiable copy of the yml fixture, in a temporary directory (in memory if possible).
+        # the directory is unique per test and worker process, so tests can run with trial --jobs
+        self._temp_dir = tempfile.TemporaryDirectory(
+            prefix="relayer_{0}_".format(os.getpid()),
+            dir=_IN_MEMORY_DIR if os.path.isdir(_IN_MEMORY_DIR) else None,
         )
-        self._aux_config_dict = self._relayer_config_yml_to_dict(self._aux_file_path)
-
-        self._relayer = tools.relayer.core.Relayer(
-            self._logger, self._modifiable_file_path
+        self._modifiable_file_path = os.path.join(
+            self._temp_dir.name, modifiable_file_name
         )
+        with open(self._modifiable_file_path, "wb") as f:
+            f.write(self._fixture_contents(original_file_path))
+
+        self._original_config_dict = self._fixture_yml_to_dict(original_file_path)
+        self._aux_config_dict = self._fixture_yml_to_dict(self._aux_file_path)
+
+        # a single relayer serves all tests, pointed at each test's config
+        cls = type(self)
+        if cls._relayer is None:
+            cls._relayer = tools.relayer.core.Relayer(
+                self._logger, self._modifiable_file_path
+            )
+        else:
+            cls._relayer.config_path = self._modifiable_file_path
 
     def tearDown(self):
 
         # remove the modifiable copy of the yml file
-        os.remove(self._modifiable_file_path)
+        self._temp_dir.cleanup()
 
     def test_nothing_changed(self):
-        self._relayer.relayer_config(
-            add_kvs=None,
+        self._apply()
+
+        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
+        self.assertEqual(result, self._original_config_dict)
+
+    def test_default_output_unchanged(self):
+        anchors_fixture_contents = self._fixture_contents(_ANCHORS_FIXTURE_PATH)
+        with open(self._modifiable_file_path, "wb") as f:
+            f.write(anchors_fixture_contents)
+
+        relayer = tools.relayer.core.Relayer(self._logger, self._modifiable_file_path)
+        relayer.relayer_config(
+            **dict(self._relayer_config_defaults, add_kvs=["other=1"])
+        )
+
+        # comments, anchors, merge keys, unquoted yes and octals are all kept as is
+        with open(self._modifiable_file_path, "rb") as f:
+            self.assertEqual(f.read(), anchors_fixture_contents + b"other: 1\n")
+
+    def test_yaml11_ambiguous_strings_stay_quoted(self):
+        for round_trip in [True, False]:
+            with open(self._modifiable_file_path, "w") as f:
+                f.write("a: 'yes'\nb: 'on'\nc: 'off'\nf: 'y'\n")
+
+            # values given as kvs too
+            relayer = tools.relayer.core.Relayer(
+                self._logger, self._modifiable_file_path, round_trip=round_trip
+            )
+            relayer.relayer_config(
+                **dict(self._relayer_config_defaults, add_kvs=["z=1", "k=on", "l=null"])
+            )
+
+            # YAML 1.1 loaders (e.g. PyYAML) read unquoted yes/on/off/y as booleans
+            yaml11_safe_yaml = yaml.YAML(typ="safe")
+            yaml11_safe_yaml.version = (1, 1)
+            with open(self._modifiable_file_path, "rb") as f:
+                result = yaml11_safe_yaml.load(f)
+            self.assertEqual(
+                result,
+                {
+                    "a": "yes",
+                    "b": "on",
+                    "c": "off",
+                    "f": "y",
+                    "z": 1,
+                    "k": "on",
+                    "l": "null",
+                },
+            )
+
+    def test_round_trip_preserves_comments(self):
+        round_trip_relayer = tools.relayer.core.Relayer(
+            self._logger, self._modifiable_file_path, round_trip=True
+        )
+        round_trip_relayer.relayer_config(
+            add_kvs=["field_3=123"],
             rm_keys=None,
             update_kvs=None,
             extend_kvs=None,
             insert_kvs=None,
             rm_list_element_keys=None,
-            file_path_to_merge=None,
+            file_path_to_merge=self._aux_file_path,
+        )
+
+        with open(self._modifiable_file_path) as f:
+            config_contents = f.read()
+
+        # the license header and the original quoting (merged values' too) survived the rewrite
+        self.assertIn("# Copyright 2022 Iguazio", config_contents)
+        self.assertIn("sub_field_1: 'r3lay3r'", config_contents)
+        self.assertIn(
+            "field_2:\n  sub_field_0:\n    sub_sub_field_0: 'ab'", config_contents
         )
 
         result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-        self.assertEquals(result, self._original_config_dict)
+        self.assertEqual(result["field_3"], 123)
 
     def test_addition_to_empty_file(self):
 
         # clear the file
         open(self._modifiable_file_path, "w").close()
 
-        self._relayer.relayer_config(
-            add_kvs=["aa=bb"],
-            rm_keys=None,
-            update_kvs=None,
-            extend_kvs=None,
-            insert_kvs=None,
-            rm_list_element_keys=None,
-            file_path_to_merge=None,
-        )
+        self._apply(add_kvs=["aa=bb"])
 
         result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-        self.assertEquals(result, {"aa": "bb"})
+        self.assertEqual(result, {"aa": "bb"})
 
     def test_addition_to_existing_file(self):
 
         # add a totally new field
-        self._relayer.relayer_config(
-            add_kvs=["field_2.sub_field_0=123"],
-            rm_keys=None,
-            update_kvs=None,
-            extend_kvs=None,
-            insert_kvs=None,
-            rm_list_element_keys=None,
-            file_path_to_merge=None,
-        )
-
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
+        result = self._apply(add_kvs=["field_2.sub_field_0=123"])
 
-        self.assertEquals(result["field_2"]["sub_field_0"], 123)
+        self.assertEqual(result["field_2"]["sub_field_0"], 123)
 
         # add a sub-field to existing field and replace other field
-        self._relayer.relayer_config(
+        result = self._apply(
             add_kvs=[
                 "field_0.sub_field_0.sub_sub_field_test=456",
                 "field_2.sub_field_1=a",
             ],
-            rm_keys=None,
-            update_kvs=None,
-            extend_kvs=None,
-            insert_kvs=None,
-            rm_list_element_keys=None,
-            file_path_to_merge=None,
         )
 
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-
         # the previous field we added is still there
-        self.assertEquals(result["field_2"]["sub_field_0"], 123)
-        self.assertEquals(result["field_2"]["sub_field_1"], "a")
-        self.assertEquals(result["field_0"]["sub_field_0"]["sub_sub_field_test"], 456)
+        self.assertEqual(result["field_2"]["sub_field_0"], 123)
+        self.assertEqual(result["field_2"]["sub_field_1"], "a")
+        self.assertEqual(result["field_0"]["sub_field_0"]["sub_sub_field_test"], 456)
 
     def test_update_in_existing_file(self):
 
         self._logger.info(
             "Updating existing fields (one is a primitive, other is a list)"
         )
-        self._relayer.relayer_config(
-            add_kvs=None,
-            rm_keys=None,
-            update_kvs=["field_0.sub_field_0=abc", "field_0.sub_field_1=aa,bb"],
-            extend_kvs=None,
-            insert_kvs=None,
-            rm_list_element_keys=None,
-            file_path_to_merge=None,
+        result = self._apply(
+            update_kvs=["field_0.sub_field_0=abc", "field_0.sub_field_1=aa,bb"]
         )
 
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-
-        self.assertEquals(result["field_0"]["sub_field_0"], "abc")
-        self.assertEquals(result["field_0"]["sub_field_1"], ["aa", "bb"])
+        self.assertEqual(result["field_0"]["sub_field_0"], "abc")
+        self.assertEqual(result["field_0"]["sub_field_1"], ["aa", "bb"])
 
         self._logger.info("Updating a non-existing field")
-        self.assertRaisesRegexp(
+        self.assertRaisesRegex(
             RuntimeError,
             "Key not found in dict",
-            self._relayer.relayer_config,
-            add_kvs=None,
-            rm_keys=None,
+            self._apply,
             update_kvs=["field_0.sub_field_3=abc"],
-            extend_kvs=None,
-            insert_kvs=None,
-            rm_list_element_keys=None,
-            file_path_to_merge=None,
         )
 
     def test_update_in_dotted_path(self):
         self._logger.info("Updating an existing field where path is dotted (1/2)")
-        self._relayer.relayer_config(
-            add_kvs=None,
-            rm_keys=None,
+        result = self._apply(
             update_kvs=[
                 r"dotted\.field.internal_field[0].list\.item_0\.key1=modified",
                 r"dotted\.field.internal_field[1].list\.item_1\.key2=6",
             ],
-            extend_kvs=None,
-            insert_kvs=None,
-            rm_list_element_keys=None,
-            file_path_to_merge=None,
         )
 
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-
         # modified
-        self.assertEquals(
+        self.assertEqual(
             result["dotted.field"]["internal_field"][0]["list.item_0.key1"], "modified"
         )
-        self.assertEquals(
+        self.assertEqual(
             result["dotted.field"]["internal_field"][1]["list.item_1.key2"], 6
         )
 
         # unmodified
-        self.assertEquals(result["field_0"]["sub_field_1"], "r3lay3r")
+        self.assertEqual(result["field_0"]["sub_field_1"], "r3lay3r")
 
-        self.assertEquals(
+        self.assertEqual(
             result["dotted.field"]["internal_field"][0]["list.item_0.key2"], "value02"
         )
-        self.assertEquals(
+        self.assertEqual(
             result["dotted.field"]["internal_field"][1]["list.item_1.key1"], "value11"
         )
 
         self._logger.info("Updating an existing field where path is dotted (2/2)")
-        self._relayer.relayer_config(
-            add_kvs=None,
-            rm_keys=None,
+        result = self._apply(
             update_kvs=[
                 r"dont_open_dotted_inside.internal\.dotted\.field."
                 r"internal_1[0].list_item_0.internal_2.deep\.dotted\.field=modified",
             ],
-            extend_kvs=None,
-            insert_kvs=None,
-            rm_list_element_keys=None,
-            file_path_to_merge=None,
         )
 
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-
         # modified
-        self.assertEquals(
+        self.assertEqual(
             result["dont_open_dotted_inside"]["internal.dotted.field"]["internal_1"][0][
                 "list_item_0"
             ]["internal_2"]["deep.dotted.field"],
@@ -228,42 +288,43 @@ class RelayerTestCase(unittest.TestCase):
         )
 
         # unmodified
-        self.assertEquals(result["field_0"]["sub_field_1"], "r3lay3r")
-        self.assertEquals(
+        self.assertEqual(result["field_0"]["sub_field_1"], "r3lay3r")
+        self.assertEqual(
             result["dotted.field"]["internal_field"][1]["list.item_1.key1"], "value11"
         )
 
     def test_update_from_aux_file(self):
 
         # update existing fields (one is a primitive, other is a list)
-        self._relayer.relayer_config(
-            add_kvs=None,
-            rm_keys=None,
-            update_kvs=None,
-            extend_kvs=None,
-            insert_kvs=None,
-            rm_list_element_keys=None,
-            file_path_to_merge=self._aux_file_path,
-        )
-
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
+        result = self._apply(file_path_to_merge=self._aux_file_path)
 
         # field_0 unchanged
-        self.assertEquals(result["field_0"], self._original_config_dict["field_0"])
+        self.assertEqual(result["field_0"], self._original_config_dict["field_0"])
 
         # field_1 modified
-        self.assertEquals(
+        self.assertEqual(
             result["field_1"]["sub_field_0"]["sub_sub_field_0"],
             self._aux_config_dict["field_1"]["sub_field_0"]["sub_sub_field_0"],
         )
 
-        self.assertEquals(
+        self.assertEqual(
             result["field_1"]["sub_field_0"]["sub_sub_field_1"],
             self._original_config_dict["field_1"]["sub_field_0"]["sub_sub_field_1"],
         )
 
         # field_2 added
-        self.assertEquals(result["field_2"], self._aux_config_dict["field_2"])
+        self.assertEqual(result["field_2"], self._aux_config_dict["field_2"])
+
+    def test_update_from_contained_file(self):
+        last_modified_time = os.path.getmtime(self._modifiable_file_path)
+
+        # merging the config into itself changes nothing
+        self._apply(file_path_to_merge=self._modifiable_file_path)
+
+        # assert file was not modified
+        self.assertEqual(
+            last_modified_time, os.path.getmtime(self._modifiable_file_path)
+        )
 
     def test_removal_from_existing_file(self):
 
@@ -272,54 +333,30 @@ class RelayerTestCase(unittest.TestCase):
             "sub_sub_field_0", self._original_config_dict["field_1"]["sub_field_0"]
         )
 
-        self._relayer.relayer_config(
-            add_kvs=None,
-            rm_keys=["field_1.sub_field_0.sub_sub_field_0", "field_0.sub_field_2"],
-            update_kvs=None,
-            extend_kvs=None,
-            insert_kvs=None,
-            rm_list_element_keys=None,
-            file_path_to_merge=None,
+        result = self._apply(
+            rm_keys=["field_1.sub_field_0.sub_sub_field_0", "field_0.sub_field_2"]
         )
 
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-
         self.assertNotIn("sub_sub_field_0", result["field_1"]["sub_field_0"])
         self.assertNotIn("sub_field_2", result["field_0"])
 
         # remove a non-existing field
-        self.assertRaisesRegexp(
+        self.assertRaisesRegex(
             RuntimeError,
             "Subsection not found in dict",
-            self._relayer.relayer_config,
-            add_kvs=None,
+            self._apply,
             rm_keys=["field0.sub_field_3"],
-            update_kvs=None,
-            extend_kvs=None,
-            insert_kvs=None,
-            rm_list_element_keys=None,
-            file_path_to_merge=None,
         )
 
         # remove key with value
-        self._relayer.relayer_config(
-            add_kvs=None,
-            rm_keys=["field_1.sub_field_0.sub_sub_field_1=aa"],
-            update_kvs=None,
-            extend_kvs=None,
-            insert_kvs=None,
-            rm_list_element_keys=None,
-            file_path_to_merge=None,
-        )
-
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
+        result = self._apply(rm_keys=["field_1.sub_field_0.sub_sub_field_1=aa"])
 
         self.assertNotIn("sub_sub_field_1", result["field_1"]["sub_field_0"])
 
     def test_implicit_value_type_casting(self):
 
         # update existing fields with different value types and check conversion
-        self._relayer.relayer_config(
+        result = self._apply(
             add_kvs=[
                 "interesting_field.sub_field_0=abc",
                 "interesting_field.sub_field_1=543",
@@ -332,32 +369,53 @@ class RelayerTestCase(unittest.TestCase):
                 "interesting_field.sub_field_8=aa,34.6,t,bb",
                 "interesting_field.sub_field_9={bb:aa, dd:22.2},{kk: 1},{aa:t}",
             ],
-            rm_keys=None,
-            update_kvs=None,
-            extend_kvs=None,
-            insert_kvs=None,
-            rm_list_element_keys=None,
-            file_path_to_merge=None,
         )
 
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-
-        self.assertEquals(result["interesting_field"]["sub_field_0"], "abc")
-        self.assertEquals(result["interesting_field"]["sub_field_1"], 543)
-        self.assertEquals(result["interesting_field"]["sub_field_2"], 59.959)
-        self.assertEquals(result["interesting_field"]["sub_field_3"], True)
-        self.assertEquals(result["interesting_field"]["sub_field_4"], True)
-        self.assertEquals(result["interesting_field"]["sub_field_5"], False)
-        self.assertEquals(result["interesting_field"]["sub_field_6"], False)
-        self.assertEquals(result["interesting_field"]["sub_field_7"], ["aa", "bb"])
-        self.assertEquals(
+        self.assertEqual(result["interesting_field"]["sub_field_0"], "abc")
+        self.assertEqual(result["interesting_field"]["sub_field_1"], 543)
+        self.assertEqual(result["interesting_field"]["sub_field_2"], 59.959)
+        self.assertEqual(result["interesting_field"]["sub_field_3"], True)
+        self.assertEqual(result["interesting_field"]["sub_field_4"], True)
+        self.assertEqual(result["interesting_field"]["sub_field_5"], False)
+        self.assertEqual(result["interesting_field"]["sub_field_6"], False)
+        self.assertEqual(result["interesting_field"]["sub_field_7"], ["aa", "bb"])
+        self.assertEqual(
             result["interesting_field"]["sub_field_8"], ["aa", 34.6, True, "bb"]
         )
-        self.assertEquals(
+        self.assertEqual(
             result["interesting_field"]["sub_field_9"],
             [{"bb": "aa", "dd": 22.2}, {"kk": 1}, {"aa": True}],
         )
 
+    def test_inline_dicts_syntax(self):
+        result = self._apply(
+            add_kvs=[
+                "interesting_field.sub_field_0={aa:bb,cc,dd,kk:ll},{},{mm:nn}",
+                "interesting_field.sub_field_2={a:b}, {c:d}",
+                "interesting_field.sub_field_3= {a:b}",
+            ]
+        )
+
+        # values without a key of their own belong to the last key
+        self.assertEqual(
+            result["interesting_field"]["sub_field_0"],
+            [{"aa": ["bb", "cc", "dd"], "kk": "ll"}, {}, {"mm": "nn"}],
+        )
+
+        # whitespace around dicts is allowed
+        self.assertEqual(
+            result["interesting_field"]["sub_field_2"], [{"a": "b"}, {"c": "d"}]
+        )
+        self.assertEqual(result["interesting_field"]["sub_field_3"], [{"a": "b"}])
+
+        for malformed_value in ["{aa:bb", "{aa:{bb:cc}}", "{aa:bb}x", "{bb,aa:cc}"]:
+            self.assertRaisesRegex(
+                Exception,
+                "Wrong value syntax",
+                self._apply,
+                add_kvs=["interesting_field.sub_field_1={0}".format(malformed_value)],
+            )
+
     def test_new_non_leaf_list(self):
         """
         We're gonna create a list of strings and then modify one of the values for be a dict
@@ -372,58 +430,32 @@ class RelayerTestCase(unittest.TestCase):
         """
 
         # add a totally new field
-        self._relayer.relayer_config(
-            add_kvs=["field_0.sub_field_3=relay3_0,relay3_1,relay3_2"],
-            rm_keys=None,
-            update_kvs=None,
-            extend_kvs=None,
-            insert_kvs=None,
-            rm_list_element_keys=None,
-            file_path_to_merge=None,
-        )
+        result = self._apply(add_kvs=["field_0.sub_field_3=relay3_0,relay3_1,relay3_2"])
 
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-
-        self.assertEquals(
+        self.assertEqual(
             result["field_0"]["sub_field_3"], ["relay3_0", "relay3_1", "relay3_2"]
         )
 
         # add a sub-fields to one of the lists text fields, to coerce it into a dict
-        self._relayer.relayer_config(
+        result = self._apply(
             add_kvs=[
                 "field_0.sub_field_3.relay3_1.relay3_1_1=5",
                 "field_0.sub_field_3.relay3_1.relay3_1_2=8.8.8.8",
             ],
-            rm_keys=None,
-            update_kvs=None,
-            extend_kvs=None,
-            insert_kvs=None,
-            rm_list_element_keys=None,
-            file_path_to_merge=None,
         )
 
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-
         # the other list elements we added are still there
         self.assertTrue("relay3_0" in result["field_0"]["sub_field_3"])
         self.assertTrue("relay3_2" in result["field_0"]["sub_field_3"])
-        self.assertEquals(
+        self.assertEqual(
             result["field_0"]["sub_field_3"][1],
             {"relay3_1": {"relay3_1_1": 5, "relay3_1_2": "8.8.8.8"}},
         )
 
         # Create list with empty items
-        self._relayer.relayer_config(
-            add_kvs=["field_0.sub_field_7=item,", "field_0.sub_field_8=a,,b"],
-            rm_keys=None,
-            update_kvs=None,
-            extend_kvs=None,
-            insert_kvs=None,
-            rm_list_element_keys=None,
-            file_path_to_merge=None,
+        result = self._apply(
+            add_kvs=["field_0.sub_field_7=item,", "field_0.sub_field_8=a,,b"]
         )
-
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
         self.assertEqual(result["field_0"]["sub_field_7"], ["item"])
         self.assertEqual(result["field_0"]["sub_field_8"], ["a", "b"])
 
@@ -443,81 +475,62 @@ class RelayerTestCase(unittest.TestCase):
         """
 
         # add a totally new field
-        self._relayer.relayer_config(
-            add_kvs=["field_0.sub_field_2.relay0_0.relay0_0_0.shi=kaka"],
-            rm_keys=None,
-            update_kvs=None,
-            extend_kvs=None,
-            insert_kvs=None,
-            rm_list_element_keys=None,
-            file_path_to_merge=None,
+        result = self._apply(
+            add_kvs=["field_0.sub_field_2.relay0_0.relay0_0_0.shi=kaka"]
         )
 
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-
-        self._logger.debug("result", result=result)
+        if self._logger.isEnabledFor(tools.relayer.clients.logging.Severity.Debug):
+            self._logger.debug("result", result=result)
 
         expected_inner_list = [
             {"relay0_0": {"relay0_0_0": {"shi": "kaka"}}},
             "relay0_1",
             "relay0_2",
         ]
-        self.assertEquals(result["field_0"]["sub_field_2"], expected_inner_list)
+        self.assertEqual(result["field_0"]["sub_field_2"], expected_inner_list)
 
         # the other list elements we added are still there
-        self.assertEquals(result["field_0"]["sub_field_0"], 1024)
-        self.assertEquals(result["field_0"]["sub_field_1"], "r3lay3r")
+        self.assertEqual(result["field_0"]["sub_field_0"], 1024)
+        self.assertEqual(result["field_0"]["sub_field_1"], "r3lay3r")
 
     def test_add_item_in_list(self):
 
-        # change item in list
-        self._add_to_list("field_0.sub_field_2", "1", "change")
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-
-        self.assertEquals(result["field_0"]["sub_field_2"][1], "change")
-
-        # append item in list
-        self._add_to_list("field_0.sub_field_2", "end", "append")
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-
-        self.assertEquals(len(result["field_0"]["sub_field_2"]), 4)
-        self.assertEquals(result["field_0"]["sub_field_2"][3], "append")
-
-        # insert item in start of list
-        self._add_to_list("field_0.sub_field_2", "start", "insert_before")
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-
-        self.assertEquals(len(result["field_0"]["sub_field_2"]), 5)
-        self.assertEquals(result["field_0"]["sub_field_2"][0], "insert_before")
+        # additions of the same run are applied in order, so they're all done in a single run
+        result = self._apply(
+            add_kvs=[
+                # change item in list
+                "field_0.sub_field_2[1]=change",
+                # append item in list
+                "field_0.sub_field_2[end]=append",
+                # insert item in start of list
+                "field_0.sub_field_2[start]=insert_before",
+                # new list
+                "field_0.does_not_exist[0]=new",
+            ],
+        )
 
         # assert full list equality
         self.assertListEqual(
             result["field_0"]["sub_field_2"],
             ["insert_before", "relay0_0", "change", "relay0_2", "append"],
         )
-
-        # new list
-        self._add_to_list("field_0.does_not_exist", "0", "new")
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-
         self.assertListEqual(result["field_0"]["does_not_exist"], ["new"])
 
     def test_update_list_item_property(self):
-        self._update_list_item_property("field_2.sub_field_0", "1", "data", "1")
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
 
-        self.assertListEqual(
-            result["field_2"]["sub_field_0"],
-            [
-                {"name": "a", "data": 0},
-                {"name": "b", "data": 1},
-                {"name": "c", "data": 0},
+        # the updates don't depend on each other, so they're all done in a single run
+        result = self._apply(
+            update_kvs=[
+                "field_2.sub_field_0[1].data=1",
+                "field_2.sub_field_0[start].data=2",
+                # root is a list
+                "list_field[start].data=2",
+                # a bit more complex than the last checks
+                "list_field[1].data.sub_data[start].val=sub_val_3",
+                "list_field[2].data[0].val=h",
             ],
         )
 
-        self._update_list_item_property("field_2.sub_field_0", "start", "data", "2")
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-
         self.assertListEqual(
             result["field_2"]["sub_field_0"],
             [
@@ -526,25 +539,7 @@ class RelayerTestCase(unittest.TestCase):
                 {"name": "c", "data": 0},
             ],
         )
-
-        # root is a list
-        self._update_list_item_property("list_field", "start", "data", "2")
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-
         self.assertEqual(result["list_field"][0]["data"], 2)
-
-        # a bit more complex than the last checks
-        self._relayer.relayer_config(
-            add_kvs=None,
-            rm_keys=None,
-            update_kvs=["list_field[1].data.sub_data[start].val=sub_val_3"],
-            extend_kvs=None,
-            insert_kvs=None,
-            rm_list_element_keys=None,
-            file_path_to_merge=None,
-        )
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-
         self.assertDictEqual(
             result["list_field"][1]["data"]["sub_data"][0],
             {"attr": "sub_a", "val": "sub_val_3"},
@@ -553,18 +548,6 @@ class RelayerTestCase(unittest.TestCase):
             result["list_field"][1]["data"]["sub_data"][1],
             {"attr": "sub_b", "val": "sub_val_2"},
         )
-
-        self._relayer.relayer_config(
-            add_kvs=None,
-            rm_keys=None,
-            update_kvs=["list_field[2].data[0].val=h"],
-            extend_kvs=None,
-            insert_kvs=None,
-            rm_list_element_keys=None,
-            file_path_to_merge=None,
-        )
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-
         self.assertDictEqual(
             result["list_field"][2]["data"][0], {"attr": "d", "val": "h"}
         )
@@ -572,21 +555,51 @@ class RelayerTestCase(unittest.TestCase):
             result["list_field"][2]["data"][1], {"attr": "f", "val": "g"}
         )
 
+    def test_update_all_matching_list_items(self):
+
+        # a key in an unindexed list of dicts is set on every item that has it
+        result = self._apply(
+            add_kvs=["field_2.sub_field_0.name=2.5"],
+            update_kvs=["list_field[1].data.sub_data.attr=x"],
+        )
+
+        self.assertListEqual(
+            result["field_2"]["sub_field_0"],
+            [
+                {"name": 2.5, "data": 0},
+                {"name": 2.5, "data": 0},
+                {"name": 2.5, "data": 0},
+            ],
+        )
+        self.assertListEqual(
+            result["list_field"][1]["data"]["sub_data"],
+            [{"attr": "x", "val": "sub_val_1"}, {"attr": "x", "val": "sub_val_2"}],
+        )
+
+    def test_remove_from_all_matching_list_items(self):
+
+        # a key in an unindexed list of dicts is removed from every item that has it
+        result = self._apply(rm_keys=["field_2.sub_field_0.name"])
+
+        self.assertListEqual(
+            result["field_2"]["sub_field_0"], [{"data": 0}, {"data": 0}, {"data": 0}]
+        )
+
     def test_insert_item_in_list(self):
 
         # change item in list
-        self._add_to_list("field_0.sub_field_2", "1", "insert", insert=True)
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
+        result = self._add_to_list("field_0.sub_field_2", "1", "insert", insert=True)
 
-        self.assertEquals(len(result["field_0"]["sub_field_2"]), 4)
-        self.assertEquals(result["field_0"]["sub_field_2"][1], "insert")
+        self.assertEqual(len(result["field_0"]["sub_field_2"]), 4)
+        self.assertEqual(result["field_0"]["sub_field_2"][1], "insert")
 
         # insert item in start of list
-        self._add_to_list("field_0.sub_field_2", "0", "insert_before", insert=True)
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
+        result = self._add_to_list(
+            "field_0.sub_field_2", "0", "insert_before", insert=True
+        )
 
-        self.assertEquals(len(result["field_0"]["sub_field_2"]), 5)
-        self.assertEquals(result["field_0"]["sub_field_2"][0], "insert_before")
+        self.assertEqual(len(result["field_0"]["sub_field_2"]), 5)
+        self.assertEqual(result["field_0"]["sub_field_2"][0], "insert_before")
 
         # assert full list equality
         self.assertListEqual(
@@ -615,56 +628,24 @@ class RelayerTestCase(unittest.TestCase):
 
     def test_extend_list(self):
 
-        # extend list to the end with brackets
-        self._extend_list("field_0.sub_field_2", "", "extend,this")
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-
-        self.assertListEqual(
-            result["field_0"]["sub_field_2"],
-            ["relay0_0", "relay0_1", "relay0_2", "extend", "this"],
-        )
-
-        # extend single to the end with brackets
-        self._extend_list("field_0.sub_field_2", "", "single")
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-
-        self.assertListEqual(
-            result["field_0"]["sub_field_2"],
-            ["relay0_0", "relay0_1", "relay0_2", "extend", "this", "single"],
-        )
-
-        # extend single to the start
-        self._extend_list("field_0.sub_field_2", "start", "single")
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-
-        self.assertListEqual(
-            result["field_0"]["sub_field_2"],
-            ["single", "relay0_0", "relay0_1", "relay0_2", "extend", "this", "single"],
-        )
-
-        # extend list to the end without brackets
-        self._extend_list("field_0.sub_field_2", "", "and,this", brackets=False)
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-
-        self.assertListEqual(
-            result["field_0"]["sub_field_2"],
-            [
-                "single",
-                "relay0_0",
-                "relay0_1",
-                "relay0_2",
-                "extend",
-                "this",
-                "single",
-                "and",
-                "this",
+        # extensions of the same run are applied in order, so they're all done in a single run
+        result = self._apply(
+            extend_kvs=[
+                # extend list to the end with brackets
+                "field_0.sub_field_2[]=extend,this",
+                # extend single to the end with brackets
+                "field_0.sub_field_2[]=single",
+                # extend single to the start
+                "field_0.sub_field_2[start]=single",
+                # extend list to the end without brackets
+                "field_0.sub_field_2=and,this",
+                # extend list to the beginning
+                "field_0.sub_field_2[start]=this,before",
+                # extend list in middle
+                "field_1.sub_field_0.sub_sub_field_1.sub_sub_sub_field_0[1]=middle,between",
             ],
         )
 
-        # extend list to the beginning
-        self._extend_list("field_0.sub_field_2", "start", "this,before")
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-
         self.assertListEqual(
             result["field_0"]["sub_field_2"],
             [
@@ -681,20 +662,21 @@ class RelayerTestCase(unittest.TestCase):
                 "this",
             ],
         )
-
-        # extend list in middle
-        self._extend_list(
-            "field_1.sub_field_0.sub_sub_field_1.sub_sub_sub_field_0",
-            "1",
-            "middle,between",
-        )
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
-
         self.assertListEqual(
             result["field_1"]["sub_field_0"]["sub_sub_field_1"]["sub_sub_sub_field_0"],
             ["relay1_0", "middle", "between", "relay1_1", "relay1_2"],
         )
 
+    def test_extend_list_out_of_range(self):
+
+        # an index past the end of the list extends its end, in order
+        result = self._extend_list("field_0.sub_field_2", "10", "a,b")
+
+        self.assertListEqual(
+            result["field_0"]["sub_field_2"],
+            ["relay0_0", "relay0_1", "relay0_2", "a", "b"],
+        )
+
     def test_fail_extend_in_list(self):
 
         # extend item in key that doesn't exist
@@ -710,22 +692,21 @@ class RelayerTestCase(unittest.TestCase):
     def test_remove_from_list(self):
 
         # remove from list by index
-        self._remove_from_list("field_0.sub_field_2", "1")
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
+        result = self._remove_from_list("field_0.sub_field_2", "1")
 
         self.assertListEqual(result["field_0"]["sub_field_2"], ["relay0_0", "relay0_2"])
 
         # remove from list by value
-        self._remove_from_list("field_0.sub_field_2", "relay0_2", by_value=True)
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
+        result = self._remove_from_list(
+            "field_0.sub_field_2", "relay0_2", by_value=True
+        )
 
         self.assertListEqual(result["field_0"]["sub_field_2"], ["relay0_0"])
 
         # remove from list by value (json)
-        self._remove_from_list(
+        result = self._remove_from_list(
             "field_2.sub_field_0", '{"name": "a", "data": 0}', by_value=True
         )
-        result = self._relayer_config_yml_to_dict(self._modifiable_file_path)
 
         self.assertListEqual(
             result["field_2"]["sub_field_0"],
@@ -794,34 +775,15 @@ class RelayerTestCase(unittest.TestCase):
         )
 
         # assert file was not modified
-        self.assertEquals(
+        self.assertEqual(
             last_modified_time, os.path.getmtime(self._modifiable_file_path)
         )
 
     def _add_to_list(self, key, idx, value, insert=False):
         query_str = "{key}[{idx}]={value}".format(key=key, idx=idx, value=value)
-        self._relayer.relayer_config(
+        return self._apply(
             add_kvs=None if insert else [query_str],
-            rm_keys=None,
-            update_kvs=None,
-            extend_kvs=None,
             insert_kvs=None if not insert else [query_str],
-            rm_list_element_keys=None,
-            file_path_to_merge=None,
-        )
-
-    def _update_list_item_property(self, key, idx, item_property, value):
-        query_str = "{key}[{idx}].{item_property}={value}".format(
-            key=key, idx=idx, item_property=item_property, value=value
-        )
-        self._relayer.relayer_config(
-            add_kvs=None,
-            rm_keys=None,
-            update_kvs=[query_str],
-            extend_kvs=None,
-            insert_kvs=None,
-            rm_list_element_keys=None,
-            file_path_to_merge=None,
         )
 
     def _extend_list(self, key, idx, value, brackets=True):
@@ -830,29 +792,30 @@ class RelayerTestCase(unittest.TestCase):
         else:
             query_str = "{key}={value}".format(key=key, value=value)
 
-        self._relayer.relayer_config(
-            add_kvs=None,
-            rm_keys=None,
-            update_kvs=None,
-            extend_kvs=[query_str],
-            insert_kvs=None,
-            rm_list_element_keys=None,
-            file_path_to_merge=None,
-        )
+        return self._apply(extend_kvs=[query_str])
 
     def _remove_from_list(self, key, idx, by_value=False, ignore_not_found=False):
         query_str = "{key}[{idx}]".format(key=key, idx=idx)
-        self._relayer.relayer_config(
-            add_kvs=None,
+        return self._apply(
             rm_keys=None if by_value else [query_str],
-            update_kvs=None,
-            extend_kvs=None,
-            insert_kvs=None,
             rm_list_element_keys=None if not by_value else [query_str],
-            file_path_to_merge=None,
             ignore_not_found=ignore_not_found,
         )
 
+    def _apply(self, **kwargs):
+        return self._relayer.relayer_config(
+            **dict(self._relayer_config_defaults, **kwargs)
+        )
+
+    @classmethod
+    def _fixture_contents(cls, fixture_path):
+        return _read_fixture(fixture_path)[0]
+
+    @classmethod
+    def _fixture_yml_to_dict(cls, fixture_path):
+        return pickle.loads(_read_fixture(fixture_path)[1])
+
     @staticmethod
     def _relayer_config_yml_to_dict(config_path):
-        return yaml.safe_load(open(config_path))
+        with open(config_path, "rb") as f:
+            return _safe_yaml.load(f)